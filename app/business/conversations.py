@@ -0,0 +1,69 @@
+from azurefunctions.extensions.http.fastapi import Request, Response
+
+from app.core.http import error_response, int_param, json_response, ndjson_response, read_json
+from app.services.db_services.cosmosdb_services import ConflictError, NotFoundError, get_db_service
+
+
+def create_conversation(req: Request) -> Response:
+    try:
+        body = read_json(req)
+        convo = get_db_service().create_conversation(user_id=body.get("user_id", ""), id=body.get("id"))
+    except ConflictError as ex:
+        return error_response(409, str(ex))
+    except ValueError as ex:
+        return error_response(400, str(ex))
+    return json_response(req, convo, status_code=201)
+
+
+def get_conversation(req: Request) -> Response:
+    convo = get_db_service().get_conversation(req.path_params.get("id", ""))
+    if convo is None:
+        return error_response(404, "conversation not found")
+    return json_response(req, convo)
+
+
+def append_message(req: Request) -> Response:
+    try:
+        body = read_json(req)
+        msg = get_db_service().append_message(
+            conversation_id=req.path_params.get("id", ""),
+            role=body.get("role", ""),
+            content=body.get("content") or "",
+            meta=body.get("meta"),
+        )
+    except NotFoundError as ex:
+        return error_response(404, str(ex))
+    except ConflictError as ex:
+        return error_response(409, str(ex))
+    except ValueError as ex:
+        return error_response(400, str(ex))
+    return json_response(req, msg, status_code=201)
+
+
+def stream_conversations(req: Request) -> Response:
+    # NDJSON de conversaciones de ?user_id= (sin historial).
+    user_id = req.query_params.get("user_id")
+    if not user_id:
+        return error_response(400, "'user_id' is required")
+    return ndjson_response(req, get_db_service().iter_conversations(user_id))
+
+
+def stream_history(req: Request) -> Response:
+    # NDJSON del historial. Acepta ?limit=, ?max_tokens= y ?summary=1 (antepone el resumen).
+    # Una sola lectura: la ventana se arma sobre la misma conversación que valida el 404.
+    svc = get_db_service()
+    try:
+        limit = int_param(req.query_params, "limit")
+        max_tokens = int_param(req.query_params, "max_tokens")
+    except ValueError as ex:
+        return error_response(400, str(ex))
+    convo = svc.conversation_repo.get(req.path_params.get("id", ""))
+    if convo is None:
+        return error_response(404, "conversation not found")
+    history = svc.history_window(
+        convo,
+        limit,
+        max_tokens=max_tokens,
+        include_summary=req.query_params.get("summary") in ("1", "true"),
+    )
+    return ndjson_response(req, history)
@@ -0,0 +1,40 @@
+from azurefunctions.extensions.http.fastapi import Request, Response
+
+from app.core.http import error_response, json_response, ndjson_response, read_json
+from app.services.db_services.cosmosdb_services import get_db_service
+
+
+def check_text(req: Request) -> Response:
+    try:
+        body = read_json(req)
+    except ValueError as ex:
+        return error_response(400, str(ex))
+    allowed, matches = get_db_service().is_text_allowed(body.get("text") or "")
+    return json_response(req, {"allowed": allowed, "matches": matches})
+
+
+def check_conversation(req: Request) -> Response:
+    result = get_db_service().validate_conversation_content(req.path_params.get("id", ""))
+    if result is None:
+        return error_response(404, "conversation not found")
+    return json_response(req, result)
+
+
+def block_word(req: Request) -> Response:
+    try:
+        body = read_json(req) if req.state.body else {}
+        item = get_db_service().block_word(word=req.path_params.get("word", ""), reason=body.get("reason", ""))
+    except ValueError as ex:
+        return error_response(400, str(ex))
+    return json_response(req, item)
+
+
+def unblock_word(req: Request) -> Response:
+    if not get_db_service().unblock_word(req.path_params.get("word", "")):
+        return error_response(404, "term not found")
+    return Response(status_code=204)
+
+
+def stream_blocked(req: Request) -> Response:
+    # NDJSON de términos bloqueados (desde la cache del servicio).
+    return ndjson_response(req, ({"word": w} for w in get_db_service().list_blocked_terms()))
@@ -1,10 +1,10 @@
 import json
-import azure.functions as func
+from azurefunctions.extensions.http.fastapi import Request, Response
 
-def make_ping(req: func.HttpRequest) -> func.HttpResponse:
-    name = req.params.get("name", "world")
-    return func.HttpResponse(
+def make_ping(req: Request) -> Response:
+    name = req.query_params.get("name", "world")
+    return Response(
         json.dumps({"ok": True, "message": "pong", "who": name}),
-        mimetype="application/json",
+        media_type="application/json",
         status_code=200
     )
@@ -0,0 +1,53 @@
+from azurefunctions.extensions.http.fastapi import Request, Response
+
+from app.core.http import error_response, json_response, ndjson_response, read_json
+from app.services.db_services.cosmosdb_services import get_db_service
+
+
+def get_resource(req: Request) -> Response:
+    resource = get_db_service().get_resource(req.path_params.get("id", ""))
+    if resource is None:
+        return error_response(404, "resource not found")
+    return json_response(req, resource, etag=True)
+
+
+def put_resource(req: Request) -> Response:
+    try:
+        body = read_json(req)
+        resource = get_db_service().upsert_resource(
+            id=req.path_params.get("id", ""),
+            name=body.get("name", ""),
+            kind=body.get("kind", "generic"),
+            content=body.get("content"),
+        )
+    except ValueError as ex:
+        return error_response(400, str(ex))
+    return json_response(req, resource)
+
+
+def delete_resource(req: Request) -> Response:
+    if not get_db_service().delete_resource(req.path_params.get("id", "")):
+        return error_response(404, "resource not found")
+    return Response(status_code=204)
+
+
+def get_prompt(req: Request) -> Response:
+    name = req.path_params.get("name", "")
+    content = get_db_service().get_prompt(name)
+    if content is None:
+        return error_response(404, "prompt not found")
+    return json_response(req, {"name": name, "content": content}, etag=True)
+
+
+def put_prompt(req: Request) -> Response:
+    try:
+        body = read_json(req)
+        resource = get_db_service().set_prompt(req.path_params.get("name", ""), body.get("content") or "")
+    except ValueError as ex:
+        return error_response(400, str(ex))
+    return json_response(req, resource)
+
+
+def stream_resources(req: Request) -> Response:
+    # NDJSON de Resources (?kind= opcional).
+    return ndjson_response(req, get_db_service().iter_resources(req.query_params.get("kind")))
@@ -1,10 +1,30 @@
 # app/core/config.py
+import json
 import os
 from dataclasses import dataclass
 from dotenv import load_dotenv, find_dotenv
 
 load_dotenv(find_dotenv(".env", raise_error_if_not_found=False))
 
+_HOST_JSON = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "host.json")
+
+
+def _host_setting(*path: str):
+    # Valor efectivo de host.json: el host acepta overrides por app setting
+    # (AzureFunctionsJobHost__a__b), que tienen prioridad sobre el archivo.
+    value = os.getenv("__".join(("AzureFunctionsJobHost", *path)))
+    if value:
+        return value
+    try:
+        with open(_HOST_JSON, encoding="utf-8") as f:
+            node = json.load(f)
+        for key in path:
+            node = node[key]
+        return node
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
 @dataclass
 class Settings:
     # Entorno
@@ -19,4 +39,62 @@ class Settings:
     COSMOS_DB: str = os.getenv("COSMOS_DB", "aiagents")
     KEYVAULT_URI: str | None = os.getenv("KEYVAULT_URI")
 
+    # Contenedores de Cosmos
+    CONTAINER_RES: str = os.getenv("CONTAINER_RES") or "resources"
+    CONTAINER_CONV: str = os.getenv("CONTAINER_CONV") or "conversations"
+    CONTAINER_BLOCK: str = os.getenv("CONTAINER_BLOCK") or "blocked"
+    CONTAINER_EMAIL: str = os.getenv("CONTAINER_EMAIL") or "email_deliveries"
+
+    # Historial y compactación de conversaciones
+    HISTORY_MAX_TOKENS: int = int(os.getenv("HISTORY_MAX_TOKENS") or 3000)
+    COMPACTION_TRIGGER_MESSAGES: int = int(os.getenv("COMPACTION_TRIGGER_MESSAGES") or 60)
+    COMPACTION_KEEP_MESSAGES: int = int(os.getenv("COMPACTION_KEEP_MESSAGES") or 20)
+    SUMMARY_MAX_TOKENS: int = int(os.getenv("SUMMARY_MAX_TOKENS") or 500)
+
+    # Blob Storage para archivos. Por defecto la cuenta del host (AzureWebJobsStorage);
+    # el disco local (ARCHIVE_LOCAL_DIR) sólo se admite con ENV=dev.
+    ARCHIVE_STORAGE_CONNECTION: str | None = os.getenv("ARCHIVE_STORAGE_CONNECTION") or os.getenv("AzureWebJobsStorage")
+    ARCHIVE_CONTAINER: str = os.getenv("ARCHIVE_CONTAINER") or "conversation-archive"
+    ARCHIVE_LOCAL_DIR: str = os.getenv("ARCHIVE_LOCAL_DIR") or "/tmp/conversation-archive"
+
+    # Tiering hot/cold: conversaciones inactivas pasan a Blob dejando un stub en Cosmos
+    TIERING_IDLE_DAYS: int = int(os.getenv("TIERING_IDLE_DAYS") or 30)
+    TIERING_BATCH_SIZE: int = int(os.getenv("TIERING_BATCH_SIZE") or 500)
+    TIER_CACHE_SIZE: int = int(os.getenv("TIER_CACHE_SIZE") or 256)
+
+    # Admission control de HTTP triggers (por usuario/ruta y por worker)
+    THROTTLE_RATE: float = float(os.getenv("THROTTLE_RATE") or 5)
+    THROTTLE_BURST: int = int(os.getenv("THROTTLE_BURST") or 20)
+    THROTTLE_MAX_INFLIGHT: int = int(os.getenv("THROTTLE_MAX_INFLIGHT") or 64)
+    THROTTLE_REDIS_URL: str | None = os.getenv("THROTTLE_REDIS_URL")
+
+    # Email: cola de salida + SMTP con pool de conexiones. EMAIL_QUEUE_CONNECTION es también
+    # el app setting del queue trigger: debe existir en el host (infra/local.settings.json).
+    EMAIL_QUEUE_CONNECTION: str | None = os.getenv("EMAIL_QUEUE_CONNECTION") or os.getenv("AzureWebJobsStorage")
+    EMAIL_QUEUE_NAME: str = os.getenv("EMAIL_QUEUE_NAME") or "email-outbox"
+    EMAIL_BATCH_SIZE: int = int(os.getenv("EMAIL_BATCH_SIZE") or 16)  # sólo EmailWorker.drain() (sin host)
+    # Derivado de extensions.queues.maxDequeueCount del host: al llegar a ese intento
+    # deliver() registra "failed" justo antes de que el host mande el mensaje a la poison queue.
+    EMAIL_MAX_DEQUEUE: int = int(_host_setting("extensions", "queues", "maxDequeueCount") or 5)
+    SMTP_HOST: str = os.getenv("SMTP_HOST") or "localhost"
+    SMTP_PORT: int = int(os.getenv("SMTP_PORT") or 25)
+    SMTP_USER: str | None = os.getenv("SMTP_USER")
+    SMTP_PASSWORD: str | None = os.getenv("SMTP_PASSWORD")
+    SMTP_STARTTLS: bool = (os.getenv("SMTP_STARTTLS") or "false").lower() in ("1", "true", "yes")
+    SMTP_FROM: str = os.getenv("SMTP_FROM") or "no-reply@localhost"
+    SMTP_POOL_SIZE: int = int(os.getenv("SMTP_POOL_SIZE") or 4)
+    SMTP_MAX_RETRIES: int = int(os.getenv("SMTP_MAX_RETRIES") or 3)
+
+    # Respuestas HTTP: se comprimen (gzip/br) sólo por encima de este tamaño
+    HTTP_COMPRESS_MIN_BYTES: int = int(os.getenv("HTTP_COMPRESS_MIN_BYTES") or 1024)
+
+    # Perfilado bajo demanda de invocaciones (apagado por defecto)
+    PROFILE_SAMPLE_RATE: float = float(os.getenv("PROFILE_SAMPLE_RATE") or 0)
+    PROFILE_TOKEN: str | None = os.getenv("PROFILE_TOKEN")
+    PROFILE_MODE: str = os.getenv("PROFILE_MODE") or "sample"  # sample | cprofile
+    PROFILE_INTERVAL_MS: float = float(os.getenv("PROFILE_INTERVAL_MS") or 5)
+    PROFILE_STORAGE_CONNECTION: str | None = os.getenv("PROFILE_STORAGE_CONNECTION")
+    PROFILE_CONTAINER: str = os.getenv("PROFILE_CONTAINER") or "profiles"
+    PROFILE_LOCAL_DIR: str = os.getenv("PROFILE_LOCAL_DIR") or "/tmp/profiles"
+
 settings = Settings()
@@ -0,0 +1,186 @@
+from __future__ import annotations
+from typing import Any, Callable, Iterable, Iterator, Mapping, Optional
+import asyncio
+import gzip
+import hashlib
+import json
+import zlib
+
+# Todas las rutas HTTP usan los tipos de la extensión de streaming (Request/Response de
+# Starlette): con la extensión cargada el worker activa HTTP streaming para toda la app.
+from azurefunctions.extensions.http.fastapi import Request, Response, StreamingResponse
+
+from app.core import profiling
+from app.core.config import settings
+
+# Encoder JSON rápido opcional; sin orjson se usa json estándar compacto.
+try:
+    import orjson  # type: ignore
+except Exception:  # pragma: no cover
+    orjson = None  # type: ignore
+
+# Brotli opcional; sin él sólo se negocia gzip.
+try:
+    import brotli  # type: ignore
+except Exception:  # pragma: no cover
+    brotli = None  # type: ignore
+
+JSON_MIMETYPE = "application/json"
+NDJSON_MIMETYPE = "application/x-ndjson"
+# Tamaño objetivo de cada chunk del stream (agrupa filas pequeñas en un solo write).
+_STREAM_CHUNK = 16 * 1024
+
+
+def dumps(obj: Any) -> bytes:
+    # Serializa a bytes UTF-8 (orjson si está disponible).
+    if orjson is not None:
+        return orjson.dumps(obj, default=str)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def make_etag(body: bytes, encoding: Optional[str] = None) -> str:
+    # ETag fuerte derivado del contenido sin comprimir; distinto por content-coding.
+    digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+    return f'"{digest}-{encoding}"' if encoding else f'"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    # Evalúa If-None-Match (lista separada por comas, "*" y comparación débil W/).
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    # Elige "br" o "gzip" según Accept-Encoding (ignora codings con q=0).
+    accepted = set()
+    for part in (accept_encoding or "").lower().split(","):
+        name, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(name.strip())
+    if brotli is not None and ("br" in accepted or "*" in accepted):
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=4)  # type: ignore[union-attr]
+    return gzip.compress(body, compresslevel=5)
+
+
+async def run_sync(handler: Callable[[Request], Response], req: Request) -> Response:
+    # Lee el cuerpo en el event loop y corre el handler (que hace I/O bloqueante contra
+    # Cosmos/Blob) en un thread. El cuerpo queda en req.state.body para read_json().
+    # Si la invocación se está perfilando, el perfil cubre ese thread.
+    req.state.body = await req.body()
+    return await asyncio.to_thread(profiling.call, handler, req)
+
+
+def read_json(req: Request) -> dict:
+    # Cuerpo JSON como dict; ValueError si falta o no es un objeto.
+    try:
+        body = json.loads(getattr(req.state, "body", b"") or b"")
+    except ValueError:
+        raise ValueError("request body must be valid JSON")
+    if not isinstance(body, dict):
+        raise ValueError("request body must be a JSON object")
+    return body
+
+
+def int_param(params: Mapping[str, str], name: str) -> Optional[int]:
+    # Query param entero opcional; ValueError si no es un entero.
+    raw = params.get(name)
+    if raw in (None, ""):
+        return None
+    try:
+        return int(raw)
+    except ValueError:
+        raise ValueError(f"'{name}' must be an integer")
+
+
+def json_response(
+    req: Request,
+    payload: Any,
+    *,
+    status_code: int = 200,
+    etag: bool = False,
+    headers: Optional[Mapping[str, str]] = None,
+) -> Response:
+    # Respuesta JSON con ETag/304 opcional y compresión por encima de HTTP_COMPRESS_MIN_BYTES.
+    body = dumps(payload)
+    out = dict(headers or {})
+    encoding = None
+    if len(body) >= settings.HTTP_COMPRESS_MIN_BYTES:
+        encoding = choose_encoding(req.headers.get("accept-encoding"))
+        out["Vary"] = "Accept-Encoding"
+
+    if etag:
+        tag = make_etag(body, encoding)
+        out["ETag"] = tag
+        if etag_matches(req.headers.get("if-none-match"), tag):
+            return Response(status_code=304, headers=out)
+
+    if encoding:
+        body = compress(body, encoding)
+        out["Content-Encoding"] = encoding
+    return Response(body, status_code=status_code, headers=out, media_type=JSON_MIMETYPE)
+
+
+def error_response(status_code: int, error: str) -> Response:
+    return Response(dumps({"ok": False, "error": error}), status_code=status_code, media_type=JSON_MIMETYPE)
+
+
+class _StreamCompressor:
+    # Compresor incremental: mismo formato que compress() pero chunk a chunk.
+    # Cada write() hace flush para que el cliente reciba filas completas sin esperar al final.
+
+    def __init__(self, encoding: str) -> None:
+        self._br = encoding == "br"
+        if self._br:
+            self._c = brotli.Compressor(quality=4)  # type: ignore[union-attr]
+        else:
+            self._c = zlib.compressobj(5, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def write(self, data: bytes) -> bytes:
+        if self._br:
+            return self._c.process(data) + self._c.flush()
+        return self._c.compress(data) + self._c.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._c.finish() if self._br else self._c.flush()
+
+
+def iter_ndjson(rows: Iterable[Any], encoding: Optional[str] = None) -> Iterator[bytes]:
+    # Serializa filas como NDJSON agrupándolas en chunks de ~16KB; nunca arma el cuerpo completo.
+    comp = _StreamCompressor(encoding) if encoding else None
+    buf = bytearray()
+    for row in rows:
+        buf += dumps(row)
+        buf += b"\n"
+        if len(buf) >= _STREAM_CHUNK:
+            chunk = comp.write(bytes(buf)) if comp else bytes(buf)
+            buf.clear()
+            if chunk:
+                yield chunk
+    tail = (comp.write(bytes(buf)) + comp.finish() if buf else comp.finish()) if comp else bytes(buf)
+    if tail:
+        yield tail
+
+
+def ndjson_response(req: Request, rows: Iterable[Any]) -> StreamingResponse:
+    # StreamingResponse NDJSON. El iterador es síncrono: Starlette lo consume en un
+    # threadpool, sin bloquear el loop (y dentro del perfil de la invocación, si lo hay).
+    encoding = choose_encoding(req.headers.get("accept-encoding"))
+    headers = {"Vary": "Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    body = profiling.follow(iter_ndjson(rows, encoding))
+    return StreamingResponse(body, media_type=NDJSON_MIMETYPE, headers=headers)
@@ -0,0 +1,305 @@
+from __future__ import annotations
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from functools import wraps
+from typing import Any, Callable, Iterable, Iterator, Optional, TypeVar
+import asyncio
+import cProfile
+import hmac
+import inspect
+import marshal
+import os
+import random
+import sys
+import threading
+import uuid
+
+from azurefunctions.extensions.http.fastapi import Request
+
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger("profiling")
+
+PROFILE_HEADER = "x-profile"
+
+
+class StackSampler:
+    """Muestrea periódicamente el stack de los threads que ejecutan la invocación, en formato collapsed."""
+
+    def __init__(self, interval: float = 0.005) -> None:
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._threads: set = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    @staticmethod
+    def _collapse(frame) -> str:
+        parts = []
+        while frame is not None:
+            code = frame.f_code
+            parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ";".join(reversed(parts))
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                threads = list(self._threads)
+            frames = sys._current_frames()
+            for tid in threads:
+                frame = frames.get(tid)
+                if frame is not None:
+                    self.samples[self._collapse(frame)] += 1
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def enter(self) -> None:
+        # El thread actual pasa a trabajar para la invocación: se muestrea hasta exit().
+        with self._lock:
+            self._threads.add(threading.get_ident())
+
+    def exit(self) -> None:
+        with self._lock:
+            self._threads.discard(threading.get_ident())
+
+    def stop(self) -> bytes:
+        # Detiene el muestreo y devuelve el perfil collapsed ("frame;frame;... count" por línea).
+        self._stop.set()
+        self._thread.join()
+        return "".join(f"{stack} {n}\n" for stack, n in self.samples.most_common()).encode("utf-8")
+
+
+class _CProfileSession:
+    # Misma interfaz que StackSampler; produce un .prof (pstats) convertible a flamegraph.
+    # cProfile sólo mide el thread donde se activa: enter()/exit() lo activan en cada thread
+    # que trabaja para la invocación, nunca en el event loop (compartido con otras invocaciones).
+
+    def __init__(self) -> None:
+        self._prof = cProfile.Profile()
+
+    def start(self) -> None:
+        pass
+
+    def enter(self) -> None:
+        self._prof.enable()
+
+    def exit(self) -> None:
+        self._prof.disable()
+
+    def stop(self) -> bytes:
+        self._prof.create_stats()
+        return marshal.dumps(self._prof.stats)  # mismo formato que Profile.dump_stats()
+
+
+class _Invocation:
+    # Perfil de una invocación. Se propaga por contextvar (asyncio.to_thread copia el contexto)
+    # y queda abierto mientras el handler o alguno de sus streams (follow) sigan corriendo.
+
+    def __init__(self, name: str, session, ext: str) -> None:
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        self.blob_name = f"{name}/{stamp}-{uuid.uuid4().hex[:8]}.{ext}"
+        self._session = session
+        self._pending = 1
+        self._lock = threading.Lock()
+
+    def enter(self) -> bool:
+        # False si el profiler no se puede activar en este thread (p.ej. otro cProfile activo).
+        try:
+            self._session.enter()
+            return True
+        except Exception:
+            logger.warning("profiler unavailable in this thread, %s runs unprofiled", self.blob_name)
+            return False
+
+    def exit(self) -> None:
+        self._session.exit()
+
+    def hold(self) -> None:
+        with self._lock:
+            self._pending += 1
+
+    def release(self) -> Optional[bytes]:
+        # Devuelve el perfil cuando termina el último usuario de la sesión; None mientras tanto.
+        with self._lock:
+            self._pending -= 1
+            if self._pending:
+                return None
+        return self._session.stop()
+
+    def release_in_background(self) -> None:
+        data = self.release()
+        if data is not None:
+            threading.Thread(target=_save, args=(self.blob_name, data), name="profile-upload", daemon=True).start()
+
+
+_current: ContextVar[Optional[_Invocation]] = ContextVar("profile_invocation", default=None)
+
+T = TypeVar("T")
+
+
+def call(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    # Corre fn en el thread actual dentro del perfil de la invocación en curso, si lo hay.
+    # run_sync lo usa como target de asyncio.to_thread: ahí corre el trabajo de las rutas HTTP.
+    invocation = _current.get()
+    if invocation is None:
+        return fn(*args, **kwargs)
+    entered = invocation.enter()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        if entered:
+            invocation.exit()
+
+
+def follow(chunks: Iterable[T]) -> Iterable[T]:
+    # Extiende el perfil de la invocación al cuerpo de un StreamingResponse: Starlette lo
+    # consume en su threadpool después de que el handler retornó.
+    invocation = _current.get()
+    if invocation is None:
+        return chunks
+    invocation.hold()
+    return _follow(invocation, iter(chunks))
+
+
+def _follow(invocation: _Invocation, chunks: Iterator[T]) -> Iterator[T]:
+    try:
+        while True:
+            entered = invocation.enter()
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                return
+            finally:
+                if entered:
+                    invocation.exit()
+            yield chunk
+    finally:
+        # Stream terminado, cortado por el cliente o descartado: se guarda el perfil.
+        invocation.release_in_background()
+
+
+_storage = None
+
+
+def _get_storage():
+    global _storage
+    if _storage is None:
+        from app.services.ia_services.azure_storage_services import get_profile_storage
+        _storage = get_profile_storage()
+    return _storage
+
+
+def _requested(req: Any) -> bool:
+    # Header privilegiado: X-Profile debe coincidir con PROFILE_TOKEN (comparación en tiempo constante).
+    # Se comparan bytes: compare_digest con str no-ASCII lanza TypeError. Los headers llegan
+    # decodificados como latin-1; cualquier valor inválido cuenta como "no pedido".
+    if req is None or not settings.PROFILE_TOKEN:
+        return False
+    try:
+        value = (getattr(req, "headers", None) or {}).get(PROFILE_HEADER)
+        return bool(value) and hmac.compare_digest(value.encode("latin-1"), settings.PROFILE_TOKEN.encode())
+    except Exception:
+        return False
+
+
+def _find_request(args: tuple, kwargs: dict) -> Any:
+    for a in (*args, *kwargs.values()):
+        if isinstance(a, Request):
+            return a
+    return None
+
+
+def _save(blob_name: str, data: bytes) -> Optional[str]:
+    # Persiste el perfil; un fallo se registra pero nunca afecta la respuesta.
+    try:
+        _get_storage().upload_blob(blob_name, data)
+        return blob_name
+    except Exception:
+        logger.exception("could not store profile %s", blob_name)
+        return None
+
+
+def _start(name: str) -> Optional[_Invocation]:
+    # Arranca una sesión de perfilado; None si no se pudo.
+    if settings.PROFILE_MODE == "cprofile":
+        session, ext = _CProfileSession(), "prof"
+    else:
+        session, ext = StackSampler(settings.PROFILE_INTERVAL_MS / 1000), "collapsed"
+    try:
+        session.start()
+    except Exception:
+        logger.warning("profiler unavailable, running invocation unprofiled")
+        return None
+    return _Invocation(name, session, ext)
+
+
+def _tag(response: Any, blob_name: Optional[str]) -> None:
+    if blob_name and getattr(response, "headers", None) is not None:
+        try:
+            response.headers["X-Profile-Id"] = blob_name
+        except Exception:
+            pass
+
+
+def profiled(name: str) -> Callable:
+    # Decorador de perfilado bajo demanda para handlers del FunctionApp (HTTP, timer, queue).
+    # Se activa por muestreo (PROFILE_SAMPLE_RATE) o por header X-Profile con PROFILE_TOKEN.
+    # Si ambos están apagados devuelve el handler sin envolver: costo cero.
+    # En handlers async sólo se perfila lo que corre vía call()/follow() (run_sync y
+    # ndjson_response lo hacen); el event loop lo comparten otras invocaciones.
+    def decorator(handler: Callable) -> Callable:
+        rate = settings.PROFILE_SAMPLE_RATE
+        if rate <= 0 and not settings.PROFILE_TOKEN:
+            return handler
+
+        def should_profile(args: tuple, kwargs: dict) -> bool:
+            return (rate > 0 and random.random() < rate) or _requested(_find_request(args, kwargs))
+
+        if inspect.iscoroutinefunction(handler):
+            @wraps(handler)
+            async def async_wrapper(*args, **kwargs):
+                if not should_profile(args, kwargs):
+                    return await handler(*args, **kwargs)
+                invocation = _start(name)
+                if invocation is None:
+                    return await handler(*args, **kwargs)
+                token = _current.set(invocation)
+                try:
+                    response = await handler(*args, **kwargs)
+                finally:
+                    _current.reset(token)
+                    # Con un stream pendiente el perfil lo guarda follow() al terminar el cuerpo;
+                    # la subida al storage bloquea, así que corre fuera del event loop.
+                    data = invocation.release()
+                    blob_name = invocation.blob_name
+                    if data is not None:
+                        blob_name = await asyncio.to_thread(_save, blob_name, data)
+                _tag(response, blob_name)
+                return response
+            return async_wrapper
+
+        @wraps(handler)
+        def wrapper(*args, **kwargs):
+            if not should_profile(args, kwargs):
+                return handler(*args, **kwargs)
+            invocation = _start(name)
+            if invocation is None:
+                return handler(*args, **kwargs)
+            token = _current.set(invocation)
+            try:
+                response = call(handler, *args, **kwargs)
+            finally:
+                _current.reset(token)
+                data = invocation.release()
+                blob_name = invocation.blob_name
+                if data is not None:
+                    blob_name = _save(blob_name, data)
+            _tag(response, blob_name)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,333 @@
+from __future__ import annotations
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Tuple
+import asyncio
+import inspect
+import json
+import math
+import threading
+import time
+
+from azurefunctions.extensions.http.fastapi import Request, Response, StreamingResponse
+
+from app.core.config import settings
+from app.core.logging import get_logger
+
+# Importación opcional de redis; sin él (o sin URL) el limitador es sólo local.
+try:
+    import redis  # type: ignore
+except Exception:  # pragma: no cover
+    redis = None  # type: ignore
+
+logger = get_logger("throttling")
+
+
+class TokenBucket:
+    # Token bucket clásico: capacity tokens, recarga a rate tokens/segundo.
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self, now: float) -> float:
+        # Consume un token. Devuelve 0 si se admitió, o los segundos hasta el próximo token.
+        # `now` puede ser anterior a la creación del bucket (se toma antes del lock).
+        self.tokens = min(self.capacity, self.tokens + max(0.0, now - self.updated) * self.rate)
+        self.updated = max(self.updated, now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class LocalLimiterBackend:
+    """Buckets en memoria del worker, acotados con desalojo LRU."""
+
+    blocking = False  # take() es sólo CPU: se puede llamar desde el event loop
+
+    def __init__(self, max_keys: int = 10000) -> None:
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._max_keys = max_keys
+
+    def take(self, key: str, rate: float, burst: int) -> float:
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(rate, burst)
+                if len(self._buckets) > self._max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+            return bucket.take(now)
+
+
+# Script atómico del token bucket para Redis (estado: tokens + timestamp en un hash).
+_REDIS_TAKE = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= 1 then
+  tokens = tokens - 1
+else
+  wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(wait)
+"""
+
+
+class RedisLimiterBackend:
+    """Buckets compartidos entre instancias; ante fallas de Redis degrada al backend local."""
+
+    blocking = True  # take() hace un round trip de red: los handlers async lo corren en un thread
+
+    def __init__(
+        self,
+        url: Optional[str] = None,
+        fallback: Optional[LocalLimiterBackend] = None,
+        *,
+        client: Any = None,
+        cooldown: float = 30.0,
+    ) -> None:
+        self._client = client or redis.Redis.from_url(url, socket_timeout=0.05)  # type: ignore[union-attr]
+        self._script = self._client.register_script(_REDIS_TAKE)
+        self._fallback = fallback or LocalLimiterBackend()
+        self._cooldown = cooldown
+        self._down_until = 0.0
+
+    def take(self, key: str, rate: float, burst: int) -> float:
+        # Circuit breaker: tras una falla se usa sólo el backend local durante `cooldown`
+        # segundos, en vez de pagar el timeout de Redis en cada request.
+        if time.monotonic() < self._down_until:
+            return self._fallback.take(key, rate, burst)
+        try:
+            return float(self._script(keys=[f"throttle:{key}"], args=[rate, burst, time.time()]))
+        except Exception:
+            # Un limitador caído no debe tumbar la API: se limita sólo localmente.
+            self._down_until = time.monotonic() + self._cooldown
+            logger.warning("redis limiter failed, using local buckets for %.0fs", self._cooldown)
+            return self._fallback.take(key, rate, burst)
+
+
+class AdmissionController:
+    """Token bucket por usuario/ruta + tope de requests en vuelo por worker, con métricas."""
+
+    def __init__(
+        self,
+        backend=None,
+        *,
+        rate: Optional[float] = None,
+        burst: Optional[int] = None,
+        max_inflight: Optional[int] = None,
+    ) -> None:
+        self.backend = backend or LocalLimiterBackend()
+        self.rate = rate or settings.THROTTLE_RATE
+        self.burst = burst or settings.THROTTLE_BURST
+        self.max_inflight = max_inflight or settings.THROTTLE_MAX_INFLIGHT
+        self._inflight = 0
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, route: str, outcome: str) -> None:
+        with self._lock:
+            stats = self._stats.setdefault(route, {"admitted": 0, "rate_limited": 0, "overloaded": 0})
+            stats[outcome] += 1
+
+    def acquire(
+        self,
+        route: str,
+        user: str,
+        *,
+        rate: Optional[float] = None,
+        burst: Optional[int] = None,
+    ) -> Tuple[Optional[str], float]:
+        # Intenta admitir un request. Devuelve (None, 0) si se admitió, o
+        # ("overloaded" | "rate_limited", retry_after_segundos) si se rechazó.
+        # Si se admite, el llamador debe invocar release() al terminar.
+        with self._lock:
+            if self._inflight >= self.max_inflight:
+                overloaded = True
+            else:
+                overloaded = False
+                self._inflight += 1
+        if overloaded:
+            self._count(route, "overloaded")
+            return "overloaded", 1.0
+
+        wait = self.backend.take(f"{route}:{user}", rate or self.rate, burst or self.burst)
+        if wait > 0:
+            self.release()
+            self._count(route, "rate_limited")
+            return "rate_limited", wait
+
+        self._count(route, "admitted")
+        return None, 0.0
+
+    def release(self) -> None:
+        with self._lock:
+            self._inflight -= 1
+
+    def metrics(self) -> dict:
+        # Snapshot de contadores por ruta con tasa de rechazo.
+        with self._lock:
+            routes = {}
+            for route, s in self._stats.items():
+                total = s["admitted"] + s["rate_limited"] + s["overloaded"]
+                rejected = s["rate_limited"] + s["overloaded"]
+                routes[route] = {**s, "rejection_rate": round(rejected / total, 4) if total else 0.0}
+            return {"inflight": self._inflight, "max_inflight": self.max_inflight, "routes": routes}
+
+
+# Singleton básico, igual que get_client()/get_kv().
+_admission: Optional[AdmissionController] = None
+
+
+def get_admission() -> AdmissionController:
+    global _admission
+    if _admission is None:
+        backend = None
+        if settings.THROTTLE_REDIS_URL and redis is not None:
+            try:
+                backend = RedisLimiterBackend(settings.THROTTLE_REDIS_URL)
+            except Exception:
+                logger.warning("redis limiter unavailable, using local buckets")
+        _admission = AdmissionController(backend)
+    return _admission
+
+
+def _caller_id(req: Any) -> str:
+    # Identidad para el bucket, sólo de fuentes que el cliente no controla y sin I/O:
+    # 1) principal autenticado por la plataforma (Easy Auth reescribe x-ms-client-principal-*),
+    # 2) último hop de X-Forwarded-For (lo agrega el proxy; los anteriores los puede inventar
+    #    el cliente), 3) IP de la conexión. Headers como X-User-Id no se usan: cambiarlos
+    #    en cada request daría un bucket nuevo. Tampoco se agrupa por dueño del recurso:
+    #    costaría una lectura a Cosmos antes de admitir y cualquiera que conozca el id
+    #    podría agotar el bucket del dueño.
+    headers = req.headers or {}
+    principal = headers.get("x-ms-client-principal-id")
+    if principal:
+        return f"principal:{principal}"
+    hops = [h.strip() for h in headers.get("x-forwarded-for", "").split(",") if h.strip()]
+    if hops:
+        return f"ip:{hops[-1]}"
+    client = getattr(req, "client", None)
+    host = getattr(client, "host", None)
+    return f"ip:{host}" if host else "anonymous"
+
+
+async def _acquire(ctl: AdmissionController, route: str, caller: str, **limits) -> Tuple[Optional[str], float]:
+    # Con un backend remoto (Redis) acquire() bloquea: se corre fuera del event loop.
+    # Si el request se cancela mientras tanto, el slot que llegue a tomarse se libera.
+    if not getattr(ctl.backend, "blocking", False):
+        return ctl.acquire(route, caller, **limits)
+    task = asyncio.ensure_future(asyncio.to_thread(ctl.acquire, route, caller, **limits))
+
+    def release_if_admitted(t: asyncio.Future) -> None:
+        if not t.cancelled() and t.exception() is None and t.result()[0] is None:
+            ctl.release()
+
+    try:
+        return await asyncio.shield(task)
+    except asyncio.CancelledError:
+        task.add_done_callback(release_if_admitted)
+        raise
+
+
+def _find_request(args: tuple, kwargs: dict) -> Any:
+    # El worker invoca por nombre de parámetro; se ubica el request entre los args.
+    for a in (*args, *kwargs.values()):
+        if isinstance(a, Request):
+            return a
+    raise TypeError("admission_control requires an HTTP request argument")
+
+
+def _rejection(rejected: str, retry_after: float) -> Tuple[bytes, int, Dict[str, str]]:
+    return (
+        json.dumps({"ok": False, "error": rejected}).encode("utf-8"),
+        503 if rejected == "overloaded" else 429,
+        {"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+class _ReleasingBody:
+    # Envuelve el body_iterator de un StreamingResponse: el slot en vuelo se libera cuando
+    # el stream termina, falla o se cancela (desconexión del cliente), no al devolver la
+    # respuesta. Si el stream nunca llega a iterarse se libera al recolectarse.
+
+    def __init__(self, body: AsyncIterator[bytes], release: Callable[[], None]) -> None:
+        self._body = body.__aiter__()
+        self._release = release
+        self._released = False
+
+    def __aiter__(self) -> "_ReleasingBody":
+        return self
+
+    async def __anext__(self) -> bytes:
+        try:
+            return await self._body.__anext__()
+        except BaseException:
+            self.close()
+            raise
+
+    async def aclose(self) -> None:
+        try:
+            aclose = getattr(self._body, "aclose", None)
+            if aclose is not None:
+                await aclose()
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        if not self._released:
+            self._released = True
+            self._release()
+
+    __del__ = close
+
+
+def admission_control(
+    route: str,
+    *,
+    rate: Optional[float] = None,
+    burst: Optional[int] = None,
+) -> Callable:
+    # Decorador para HTTP triggers async: rechaza rápido con 429/503 + Retry-After.
+    # Debe ir debajo de @app.route para envolver el handler real. En respuestas de
+    # streaming el slot queda ocupado hasta que termina de enviarse el cuerpo.
+    def decorator(handler: Callable) -> Callable:
+        if not inspect.iscoroutinefunction(handler):
+            raise TypeError("admission_control requires an async HTTP handler")
+
+        @wraps(handler)
+        async def wrapper(*args, **kwargs):
+            ctl = get_admission()
+            req = _find_request(args, kwargs)
+            rejected, retry_after = await _acquire(ctl, route, _caller_id(req), rate=rate, burst=burst)
+            if rejected:
+                body, status, headers = _rejection(rejected, retry_after)
+                return Response(body, status_code=status, headers=headers, media_type="application/json")
+            try:
+                response = await handler(*args, **kwargs)
+            except BaseException:
+                ctl.release()
+                raise
+            if isinstance(response, StreamingResponse):
+                response.body_iterator = _ReleasingBody(response.body_iterator, ctl.release)
+            else:
+                ctl.release()
+            return response
+        return wrapper
+    return decorator
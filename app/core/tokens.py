@@ -0,0 +1,45 @@
+from functools import lru_cache
+from typing import Any, Dict, Optional
+import os
+
+# Importación opcional de tiktoken; si no está, se usa una estimación por caracteres.
+try:
+    import tiktoken  # type: ignore
+except Exception:  # pragma: no cover
+    tiktoken = None  # type: ignore
+
+# Promedio aproximado de caracteres por token para el fallback sin tiktoken.
+_CHARS_PER_TOKEN = 4
+# Overhead fijo por mensaje (rol + delimitadores del formato chat).
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+@lru_cache(maxsize=8)
+def get_encoding(name: Optional[str] = None):
+    # Devuelve (y cachea) el encoder de tiktoken; None si no está disponible.
+    if tiktoken is None:
+        return None
+    name = name or os.getenv("TOKENIZER_ENCODING", "cl100k_base")
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception:
+        return None
+
+
+def count_tokens(text: str, encoding: Optional[str] = None) -> int:
+    # Cuenta tokens de un texto. Sólo se cachea el encoder: los mensajes casi nunca se
+    # repiten y el conteo ya queda persistido en cada mensaje ("tokens").
+    if not text:
+        return 0
+    enc = get_encoding(encoding)
+    if enc is not None:
+        return len(enc.encode(text, disallowed_special=()))
+    return max(1, (len(text) + _CHARS_PER_TOKEN - 1) // _CHARS_PER_TOKEN)
+
+
+def message_tokens(msg: Dict[str, Any]) -> int:
+    # Tokens de un mensaje: usa el conteo persistido si existe, si no lo calcula.
+    stored = msg.get("tokens")
+    if isinstance(stored, int) and stored >= 0:
+        return stored
+    return count_tokens(msg.get("content") or "") + MESSAGE_OVERHEAD_TOKENS
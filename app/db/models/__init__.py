@@ -1,5 +1,6 @@
 from .resource import Resource
 from .conversation import Conversation
 from .blocked import BlockedItem
+from .email_delivery import EmailDelivery
 
-__all__ = ["Resource", "Conversation", "BlockedItem"]
+__all__ = ["Resource", "Conversation", "BlockedItem", "EmailDelivery"]
@@ -1,7 +1,20 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Any, Dict, List
 
 @dataclass
 class Conversation:
     id: str
     user_id: str
     last_message: str = ""
+    messages: List[Dict[str, Any]] = field(default_factory=list)
+    updated_at: str = ""
+    # Resumen acumulado de los turnos compactados y su costo en tokens.
+    summary: str = ""
+    summary_tokens: int = 0
+    # Cantidad de mensajes movidos al archivo y blobs que los contienen.
+    archived_count: int = 0
+    archive_blobs: List[str] = field(default_factory=list)
+    # "hot" = documento completo en Cosmos; "cold" = stub que apunta al blob en archive_ref.
+    # Una conversación rehidratada es "hot" con archive_ref hasta que el upsert la promueve.
+    tier: str = "hot"
+    archive_ref: str = ""
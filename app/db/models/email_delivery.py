@@ -0,0 +1,12 @@
+from dataclasses import dataclass
+
+@dataclass
+class EmailDelivery:
+    id: str
+    to: str
+    subject: str = ""
+    # queued | sent | retrying | failed
+    status: str = "queued"
+    attempts: int = 0
+    error: str = ""
+    updated_at: str = ""
@@ -1,8 +1,10 @@
 # db/models/resource.py
 from dataclasses import dataclass
+from typing import Optional
 
 @dataclass
 class Resource:
     id: str
     name: str
     kind: str = "generic"
+    content: Optional[str] = None
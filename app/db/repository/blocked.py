@@ -1,9 +1,18 @@
-from typing import Optional
-from dataclasses import asdict
+from typing import Any, Iterator, Optional
+from dataclasses import asdict, fields
 from app.core.config import settings
 from db.repository.client import get_client
 from db.models import BlockedItem
 
+# Campos propios del modelo (Cosmos agrega _rid, _etag, _ts, etc.).
+_FIELDS = {f.name for f in fields(BlockedItem)}
+
+
+def _to_model(item: dict[str, Any]) -> BlockedItem:
+    # Construye el modelo ignorando metadatos de sistema de Cosmos.
+    return BlockedItem(**{k: v for k, v in item.items() if k in _FIELDS})
+
+
 # Repositorio de términos bloqueados con fallback en memoria si Cosmos no está disponible.
 class BlockedRepository:
     _mem: dict[str, BlockedItem] = {}  # Almacenamiento en memoria (modo local/desconfigurado)
@@ -19,7 +28,7 @@ class BlockedRepository:
             return self._mem.get(bid)
         try:
             item = self.cosmos.read(self.container_name, bid)
-            return BlockedItem(**item)
+            return _to_model(item)
         except Exception:
             # Si no existe o hay error de lectura, retorna None.
             return None
@@ -39,3 +48,15 @@ class BlockedRepository:
             return True
         except Exception:
             return False
+
+    def iter_all(self) -> Iterator[BlockedItem]:
+        # Itera todos los términos bloqueados (paginado por el SDK en Cosmos).
+        if not self.cosmos.is_configured:
+            yield from list(self._mem.values())
+            return
+        for item in self.cosmos.query(self.container_name, "SELECT * FROM c"):
+            yield _to_model(item)
+
+    def get_all(self) -> list[BlockedItem]:
+        # Lista completa; la usa DBService para precargar su cache de términos.
+        return list(self.iter_all())
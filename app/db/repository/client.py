@@ -4,6 +4,7 @@ import os
 
 # SDK de Cosmos
 from azure.cosmos import CosmosClient, ContainerProxy, DatabaseProxy
+from azure.core import MatchConditions
 from app.core.config import settings
 
 # Acceso opcional a Key Vault para obtener la clave si no está en env
@@ -93,6 +94,22 @@ class CosmosDBClient:
         c = self.container(container)
         return c.upsert_item(item)
 
+    def create(self, container: str, item: dict[str, Any]) -> dict[str, Any]:
+        """
+        Inserta un item nuevo; no sobreescribe.
+        Lanza CosmosResourceExistsError (409) si ya existe un item con ese id.
+        """
+        c = self.container(container)
+        return c.create_item(item)
+
+    def upsert_if_match(self, container: str, item: dict[str, Any], etag: str) -> dict[str, Any]:
+        """
+        Upsert condicional: sólo escribe si el item no cambió desde que se leyó con `etag`.
+        Lanza CosmosAccessConditionFailedError (412) si hubo una escritura intermedia.
+        """
+        c = self.container(container)
+        return c.upsert_item(item, etag=etag, match_condition=MatchConditions.IfNotModified)
+
     def delete(self, container: str, id: str, pk: Optional[str] = None) -> None:
         """Elimina un item por id (con pk opcional)."""
         c = self.container(container)
@@ -1,12 +1,26 @@
-from typing import Optional
-from dataclasses import asdict
+from typing import Any, Iterator, List, Optional, Tuple
+from dataclasses import asdict, fields
+import copy
+
+from azure.cosmos.exceptions import CosmosAccessConditionFailedError, CosmosResourceExistsError
 from app.core.config import settings
 from db.repository.client import get_client
 from db.models import Conversation
+from app.services.conversation_services.tiering import cache as cold_cache, discard_cold_blob, rehydrate
+
+# Campos propios del modelo (Cosmos agrega _rid, _etag, _ts, etc.).
+_FIELDS = {f.name for f in fields(Conversation)}
+
+
+def _to_model(item: dict[str, Any]) -> Conversation:
+    # Construye el modelo ignorando metadatos de sistema de Cosmos.
+    return Conversation(**{k: v for k, v in item.items() if k in _FIELDS})
+
 
 # Repositorio de conversaciones con fallback en memoria si Cosmos no está disponible.
 class ConversationRepository:
     _mem: dict[str, Conversation] = {}  # Almacenamiento local cuando no hay conexión
+    _mem_versions: dict[str, int] = {}  # "etag" en memoria: contador de escrituras por id
 
     def __init__(self) -> None:
         # Inicializa cliente y nombre de contenedor desde configuración.
@@ -14,24 +28,98 @@ class ConversationRepository:
         self.container_name = settings.CONTAINER_CONV
 
     def get(self, cid: str) -> Optional[Conversation]:
-        # Obtiene una conversación por id. Usa memoria si Cosmos no está configurado.
+        # Obtiene una conversación por id; si está en el tier frío la rehidrata desde Blob.
+        # Un fallo del blob se propaga: devolver None haría que el id parezca libre.
+        convo = self.get_raw(cid)
+        if convo is not None and convo.tier == "cold":
+            return rehydrate(convo)
+        return convo
+
+    def get_raw(self, cid: str) -> Optional[Conversation]:
+        # Documento tal cual está en Cosmos (o memoria), sin rehidratar stubs fríos.
         if not self.cosmos.is_configured:
             return self._mem.get(cid)
         try:
             item = self.cosmos.read(self.container_name, cid)
-            return Conversation(**item)
+            return _to_model(item)
         except Exception:
             # Si no existe o hay error de lectura, retorna None.
             return None
 
+    def create(self, c: Conversation) -> bool:
+        # Inserta sólo si el id no existe. False si ya hay una conversación con ese id.
+        cold_cache.invalidate(c.id)
+        if not self.cosmos.is_configured:
+            if c.id in self._mem:
+                return False
+            self._mem[c.id] = c
+            self._mem_versions[c.id] = 1
+            return True
+        try:
+            self.cosmos.create(self.container_name, asdict(c))
+            return True
+        except CosmosResourceExistsError:
+            return False
+
     def upsert(self, c: Conversation) -> None:
         # Inserta o actualiza la conversación. En memoria si no hay Cosmos.
+        self._write(c)
+
+    def get_with_etag(self, cid: str) -> Tuple[Optional[Conversation], Optional[str]]:
+        # Documento crudo (sin rehidratar) y su etag, para escrituras condicionales.
+        # En memoria devuelve una copia: mutarla no debe escribir antes del upsert condicional.
+        if not self.cosmos.is_configured:
+            convo = self._mem.get(cid)
+            if convo is None:
+                return None, None
+            return copy.deepcopy(convo), str(self._mem_versions.get(cid, 0))
+        try:
+            item = self.cosmos.read(self.container_name, cid)
+        except Exception:
+            return None, None
+        return _to_model(item), item.get("_etag")
+
+    def get_for_update(self, cid: str) -> Tuple[Optional[Conversation], Optional[str]]:
+        # Como get_with_etag pero rehidratando stubs fríos: para modificar y escribir con
+        # upsert_if_unchanged (el etag es el del documento guardado, stub incluido).
+        convo, etag = self.get_with_etag(cid)
+        if convo is not None and convo.tier == "cold":
+            convo = rehydrate(convo)
+        return convo, etag
+
+    def upsert_if_unchanged(self, c: Conversation, etag: Optional[str]) -> bool:
+        # Escribe sólo si el documento no cambió desde la lectura con `etag`.
+        # False si hubo una escritura intermedia (412): el llamador debe descartar su trabajo.
+        return self._write(c, etag or "")
+
+    def _write(self, c: Conversation, etag: Optional[str] = None) -> bool:
+        # Escritura común, condicional si se pasa etag. Escribir una conversación rehidratada
+        # la promueve otra vez al tier caliente: se guarda sin archive_ref y el blob frío se
+        # borra recién después de que la escritura tuvo éxito.
+        cold_cache.invalidate(c.id)
+        promoted = c.archive_ref if c.tier == "hot" else ""
         if not self.cosmos.is_configured:
-            self._mem[c.id] = c; return
-        self.cosmos.upsert(self.container_name, asdict(c))
+            if etag is not None and str(self._mem_versions.get(c.id, 0)) != etag:
+                return False
+            self._mem[c.id] = c
+            self._mem_versions[c.id] = self._mem_versions.get(c.id, 0) + 1
+        else:
+            item = {**asdict(c), "archive_ref": ""} if promoted else asdict(c)
+            if etag is None:
+                self.cosmos.upsert(self.container_name, item)
+            else:
+                try:
+                    self.cosmos.upsert_if_match(self.container_name, item, etag)
+                except CosmosAccessConditionFailedError:
+                    return False
+        if promoted:
+            c.archive_ref = ""
+            discard_cold_blob(promoted)
+        return True
 
     def delete(self, cid: str) -> bool:
         # Elimina por id. True si se eliminó, False si no se encontró o falló.
+        cold_cache.invalidate(cid)
         if not self.cosmos.is_configured:
             return self._mem.pop(cid, None) is not None
         try:
@@ -39,3 +127,53 @@ class ConversationRepository:
             return True
         except Exception:
             return False
+
+    def find_ids(self, *, min_messages: int) -> List[str]:
+        # Ids de conversaciones cuyo historial en línea supera min_messages.
+        if not self.cosmos.is_configured:
+            return [c.id for c in self._mem.values() if len(c.messages or []) > min_messages]
+        rows = self.cosmos.query(
+            self.container_name,
+            "SELECT VALUE c.id FROM c WHERE ARRAY_LENGTH(c.messages) > @n",
+            [{"name": "@n", "value": min_messages}],
+        )
+        return list(rows)
+
+    def iter_by_user(self, user_id: str) -> Iterator[Conversation]:
+        # Itera las conversaciones de un usuario, más recientes primero.
+        if not self.cosmos.is_configured:
+            convos = [c for c in list(self._mem.values()) if c.user_id == user_id]
+            yield from sorted(convos, key=lambda c: c.updated_at, reverse=True)
+            return
+        rows = self.cosmos.query(
+            self.container_name,
+            "SELECT * FROM c WHERE c.user_id = @uid ORDER BY c.updated_at DESC",
+            [{"name": "@uid", "value": user_id}],
+        )
+        for item in rows:
+            yield _to_model(item)
+
+    def find_idle_ids(self, *, before: str, limit: int) -> List[str]:
+        # Ids de conversaciones calientes sin actividad desde `before` (ISO-8601), las más viejas primero.
+        if not self.cosmos.is_configured:
+            idle = [c for c in self._mem.values() if c.tier != "cold" and c.updated_at < before]
+            return [c.id for c in sorted(idle, key=lambda c: c.updated_at)[:limit]]
+        rows = self.cosmos.query(
+            self.container_name,
+            "SELECT TOP @limit VALUE c.id FROM c "
+            "WHERE (NOT IS_DEFINED(c.tier) OR c.tier != 'cold') AND c.updated_at < @before "
+            "ORDER BY c.updated_at",
+            [{"name": "@limit", "value": limit}, {"name": "@before", "value": before}],
+        )
+        return list(rows)
+
+    def tier_counts(self) -> dict[str, int]:
+        # Cantidad de documentos por tier (tamaño del tier caliente vs. stubs fríos).
+        if not self.cosmos.is_configured:
+            cold = sum(1 for c in self._mem.values() if c.tier == "cold")
+            return {"hot": len(self._mem) - cold, "cold": cold}
+        total = next(iter(self.cosmos.query(self.container_name, "SELECT VALUE COUNT(1) FROM c")), 0)
+        cold = next(iter(self.cosmos.query(
+            self.container_name, "SELECT VALUE COUNT(1) FROM c WHERE c.tier = 'cold'"
+        )), 0)
+        return {"hot": total - cold, "cold": cold}
@@ -0,0 +1,40 @@
+from typing import Any, Optional
+from dataclasses import asdict, fields
+from app.core.config import settings
+from db.repository.client import get_client
+from db.models import EmailDelivery
+
+# Campos propios del modelo (Cosmos agrega _rid, _etag, _ts, etc.).
+_FIELDS = {f.name for f in fields(EmailDelivery)}
+
+
+def _to_model(item: dict[str, Any]) -> EmailDelivery:
+    # Construye el modelo ignorando metadatos de sistema de Cosmos.
+    return EmailDelivery(**{k: v for k, v in item.items() if k in _FIELDS})
+
+
+# Repositorio de estados de entrega de email con fallback en memoria si Cosmos no está disponible.
+class EmailDeliveryRepository:
+    _mem: dict[str, EmailDelivery] = {}  # Almacenamiento local cuando no hay conexión
+
+    def __init__(self) -> None:
+        # Inicializa cliente y nombre de contenedor desde configuración.
+        self.cosmos = get_client()
+        self.container_name = settings.CONTAINER_EMAIL
+
+    def get(self, did: str) -> Optional[EmailDelivery]:
+        # Obtiene un estado de entrega por id. Usa memoria si Cosmos no está configurado.
+        if not self.cosmos.is_configured:
+            return self._mem.get(did)
+        try:
+            item = self.cosmos.read(self.container_name, did)
+            return _to_model(item)
+        except Exception:
+            # Si no existe o hay error de lectura, retorna None.
+            return None
+
+    def upsert(self, d: EmailDelivery) -> None:
+        # Inserta o actualiza el estado. En memoria si no hay Cosmos.
+        if not self.cosmos.is_configured:
+            self._mem[d.id] = d; return
+        self.cosmos.upsert(self.container_name, asdict(d))
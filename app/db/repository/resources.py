@@ -1,9 +1,18 @@
-from typing import Optional
-from dataclasses import asdict
+from typing import Any, Iterator, Optional
+from dataclasses import asdict, fields
 from app.core.config import settings
 from db.repository.client import get_client
 from db.models import Resource
 
+# Campos propios del modelo (Cosmos agrega _rid, _etag, _ts, etc.).
+_FIELDS = {f.name for f in fields(Resource)}
+
+
+def _to_model(item: dict[str, Any]) -> Resource:
+    # Construye el modelo ignorando metadatos de sistema de Cosmos.
+    return Resource(**{k: v for k, v in item.items() if k in _FIELDS})
+
+
 # Repositorio de recursos con fallback en memoria si Cosmos no está disponible.
 class ResourceRepository:
     _mem: dict[str, Resource] = {}  # Almacenamiento local cuando no hay conexión
@@ -19,7 +28,7 @@ class ResourceRepository:
             return self._mem.get(rid)
         try:
             item = self.cosmos.read(self.container_name, rid)
-            return Resource(**item)
+            return _to_model(item)
         except Exception:
             # Si no existe o hay error de lectura, retorna None.
             return None
@@ -39,3 +48,19 @@ class ResourceRepository:
             return True
         except Exception:
             return False
+
+    def iter_all(self, kind: Optional[str] = None) -> Iterator[Resource]:
+        # Itera recursos (opcionalmente filtrados por kind) sin materializar la lista completa.
+        if not self.cosmos.is_configured:
+            yield from (r for r in list(self._mem.values()) if kind is None or r.kind == kind)
+            return
+        if kind is None:
+            rows = self.cosmos.query(self.container_name, "SELECT * FROM c")
+        else:
+            rows = self.cosmos.query(
+                self.container_name,
+                "SELECT * FROM c WHERE c.kind = @kind",
+                [{"name": "@kind", "value": kind}],
+            )
+        for item in rows:
+            yield _to_model(item)
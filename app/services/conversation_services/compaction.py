@@ -0,0 +1,104 @@
+from typing import Any, Callable, Dict, List, Optional
+from datetime import datetime, timezone
+import gzip
+import json
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.tokens import count_tokens
+from db.repository.conversations import ConversationRepository
+
+logger = get_logger("compaction")
+
+# Firma del resumidor: (resumen_previo, mensajes_a_compactar, max_tokens) -> nuevo resumen.
+Summarizer = Callable[[str, List[Dict[str, Any]], int], str]
+
+
+def tail_summary(previous: str, messages: List[Dict[str, Any]], max_tokens: int) -> str:
+    # Resumidor por defecto, SIN modelo: no resume, concatena "rol: contenido" al texto
+    # previo y descarta las líneas más viejas hasta entrar en max_tokens. Tras algunas
+    # compactaciones sólo quedan los últimos turnos archivados; el contexto anterior vive
+    # únicamente en los blobs. Para un resumen real, pasar un Summarizer basado en LLM.
+    lines = [previous] if previous else []
+    for m in messages:
+        content = " ".join(str(m.get("content") or "").split())
+        if content:
+            lines.append(f"{m.get('role', 'unknown')}: {content}")
+    while len(lines) > 1 and count_tokens("\n".join(lines)) > max_tokens:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+class ConversationCompactor:
+    """Compacta conversaciones largas: archiva turnos viejos en Blob y los resume."""
+
+    def __init__(
+        self,
+        repo: Optional[ConversationRepository] = None,
+        storage: Any = None,
+        summarizer: Optional[Summarizer] = None,
+        *,
+        trigger_messages: Optional[int] = None,
+        keep_messages: Optional[int] = None,
+        summary_max_tokens: Optional[int] = None,
+    ) -> None:
+        self.repo = repo or ConversationRepository()
+        self._storage = storage
+        self.summarizer = summarizer or tail_summary
+        self.trigger_messages = trigger_messages or settings.COMPACTION_TRIGGER_MESSAGES
+        self.keep_messages = keep_messages if keep_messages is not None else settings.COMPACTION_KEEP_MESSAGES
+        self.summary_max_tokens = summary_max_tokens or settings.SUMMARY_MAX_TOKENS
+
+    @property
+    def storage(self):
+        # Resuelve el storage de archivo en forma diferida (evita conectar si no hay trabajo).
+        if self._storage is None:
+            from app.services.ia_services.azure_storage_services import get_archive_storage
+            self._storage = get_archive_storage()
+        return self._storage
+
+    def compact(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        # Archiva los mensajes anteriores a los últimos keep_messages y actualiza el resumen.
+        convo, etag = self.repo.get_with_etag(conversation_id)
+        if not convo or convo.tier == "cold" or len(convo.messages) <= self.keep_messages:
+            return None
+
+        cut = len(convo.messages) - self.keep_messages
+        old = convo.messages[:cut]
+        start = convo.archived_count
+        blob_name = f"{convo.id}/{start:08d}-{start + cut:08d}.jsonl.gz"
+        payload = "\n".join(json.dumps(m, ensure_ascii=False) for m in old).encode("utf-8")
+        self.storage.upload_blob(blob_name, gzip.compress(payload))
+
+        convo.summary = self.summarizer(convo.summary, old, self.summary_max_tokens)
+        convo.summary_tokens = count_tokens(convo.summary)
+        convo.messages = convo.messages[cut:]
+        convo.archived_count = start + cut
+        convo.archive_blobs = [*convo.archive_blobs, blob_name]
+        convo.updated_at = datetime.now(timezone.utc).isoformat()
+
+        # Escritura condicional al etag leído: si entró un mensaje mientras se archivaba,
+        # se descarta la compactación (y su blob) en vez de pisar el mensaje.
+        if not self.repo.upsert_if_unchanged(convo, etag):
+            logger.info("compaction skipped, conversation %s changed concurrently", conversation_id)
+            try:
+                self.storage.delete_blob(blob_name)
+            except Exception:
+                logger.warning("could not delete orphan archive blob %s", blob_name)
+            return None
+        return {"id": convo.id, "archived": cut, "blob": blob_name, "summary_tokens": convo.summary_tokens}
+
+    def run(self) -> Dict[str, int]:
+        # Recorre las conversaciones que superan el umbral; un fallo no corta el lote.
+        self.storage  # sin storage de archivo válido no se compacta nada (falla la invocación)
+        stats = {"scanned": 0, "compacted": 0, "failed": 0}
+        for cid in self.repo.find_ids(min_messages=self.trigger_messages):
+            stats["scanned"] += 1
+            try:
+                if self.compact(cid):
+                    stats["compacted"] += 1
+            except Exception:
+                stats["failed"] += 1
+                logger.exception("compaction failed for conversation %s", cid)
+        logger.info("compaction run: %s", stats)
+        return stats
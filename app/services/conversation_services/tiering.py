@@ -0,0 +1,229 @@
+from collections import OrderedDict, deque
+from dataclasses import asdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Optional
+import gzip
+import json
+import threading
+import time
+import uuid
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from db.models import Conversation
+
+logger = get_logger("tiering")
+
+# Prefijo de los blobs del tier frío dentro del contenedor de archivo.
+_COLD_PREFIX = "cold"
+# Ventana para calcular la tasa de rehidratación.
+_RATE_WINDOW_SECONDS = 300
+# Vigencia de los conteos por tier (dos COUNT cross-partition en Cosmos).
+_COUNTS_TTL_SECONDS = 300
+
+
+def _cold_blob_name(conversation_id: str) -> str:
+    # Un blob por degradación: borrar el de un intento descartado (o el de una promoción)
+    # nunca puede alcanzar al blob al que apunta un stub vigente.
+    return f"{_COLD_PREFIX}/{conversation_id}/{uuid.uuid4().hex}.json.gz"
+
+
+class TieringMetrics:
+    """Contadores de degradaciones y rehidrataciones (tasa sobre los últimos 5 minutos)."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counts_lock = threading.Lock()
+        self._events: deque = deque(maxlen=10000)
+        self._counts: Optional[Dict[str, int]] = None
+        self._counts_at = 0.0
+        self.rehydrations = 0
+        self.cache_hits = 0
+        self.demotions = 0
+
+    def record_counts(self, counts: Dict[str, int]) -> None:
+        with self._lock:
+            self._counts = dict(counts)
+            self._counts_at = time.monotonic()
+
+    def tier_counts(self, compute: Callable[[], Dict[str, int]]) -> Dict[str, int]:
+        # Documentos por tier, recalculados a lo sumo una vez cada _COUNTS_TTL_SECONDS por
+        # worker (el job de tiering también los refresca). Un solo cálculo a la vez.
+        with self._counts_lock:
+            with self._lock:
+                if self._counts is not None and time.monotonic() - self._counts_at < _COUNTS_TTL_SECONDS:
+                    return dict(self._counts)
+            counts = compute()
+            self.record_counts(counts)
+            return dict(counts)
+
+    def record_rehydration(self, cache_hit: bool) -> None:
+        with self._lock:
+            self.rehydrations += 1
+            self.cache_hits += int(cache_hit)
+            self._events.append(time.monotonic())
+
+    def record_demotion(self) -> None:
+        with self._lock:
+            self.demotions += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            cutoff = time.monotonic() - _RATE_WINDOW_SECONDS
+            recent = sum(1 for t in self._events if t >= cutoff)
+            return {
+                "rehydrations": self.rehydrations,
+                "cache_hits": self.cache_hits,
+                "demotions": self.demotions,
+                "rehydrations_per_min": round(recent * 60 / _RATE_WINDOW_SECONDS, 2),
+            }
+
+
+class ColdTierCache:
+    """LRU de payloads rehidratados (JSON descomprimido) por id + archive_ref + updated_at."""
+
+    def __init__(self, max_items: Optional[int] = None) -> None:
+        self._items: "OrderedDict[str, tuple[str, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._max = max_items or settings.TIER_CACHE_SIZE
+
+    @staticmethod
+    def _version(stub: Conversation) -> str:
+        return f"{stub.archive_ref}@{stub.updated_at}"
+
+    def get(self, stub: Conversation) -> Optional[bytes]:
+        with self._lock:
+            entry = self._items.get(stub.id)
+            if entry is None or entry[0] != self._version(stub):
+                return None
+            self._items.move_to_end(stub.id)
+            return entry[1]
+
+    def put(self, stub: Conversation, payload: bytes) -> None:
+        with self._lock:
+            self._items[stub.id] = (self._version(stub), payload)
+            self._items.move_to_end(stub.id)
+            while len(self._items) > self._max:
+                self._items.popitem(last=False)
+
+    def invalidate(self, conversation_id: str) -> None:
+        with self._lock:
+            self._items.pop(conversation_id, None)
+
+
+# Estado compartido por el worker (mismo patrón singleton que get_client()).
+metrics = TieringMetrics()
+cache = ColdTierCache()
+_storage = None
+
+
+def _get_storage():
+    global _storage
+    if _storage is None:
+        from app.services.ia_services.azure_storage_services import get_archive_storage
+        _storage = get_archive_storage()
+    return _storage
+
+
+def rehydrate(stub: Conversation, storage: Any = None) -> Conversation:
+    # Devuelve la conversación completa a partir de su stub frío (cache local > blob).
+    # El resultado queda "hot" y conserva archive_ref: el próximo upsert la promueve de
+    # vuelta a Cosmos sin el puntero y recién entonces borra el blob (discard_cold_blob).
+    payload = cache.get(stub)
+    hit = payload is not None
+    if payload is None:
+        payload = gzip.decompress((storage or _get_storage()).download_blob(stub.archive_ref))
+        cache.put(stub, payload)
+    metrics.record_rehydration(hit)
+
+    convo = Conversation(**json.loads(payload))
+    convo.tier = "hot"
+    convo.archive_ref = stub.archive_ref
+    return convo
+
+
+def discard_cold_blob(blob_name: str, storage: Any = None) -> None:
+    # Borra el blob de una conversación ya promovida. Un fallo sólo deja un blob huérfano.
+    try:
+        (storage or _get_storage()).delete_blob(blob_name)
+    except Exception:
+        logger.warning("could not delete cold blob %s", blob_name)
+
+
+class ConversationTiering:
+    """Degrada conversaciones inactivas a Blob comprimido dejando un stub mínimo en Cosmos."""
+
+    def __init__(
+        self,
+        repo: Any = None,
+        storage: Any = None,
+        *,
+        idle_days: Optional[int] = None,
+        batch_size: Optional[int] = None,
+    ) -> None:
+        if repo is None:
+            from db.repository.conversations import ConversationRepository
+            repo = ConversationRepository()
+        self.repo = repo
+        self._storage = storage
+        self.idle_days = idle_days or settings.TIERING_IDLE_DAYS
+        self.batch_size = batch_size or settings.TIERING_BATCH_SIZE
+
+    @property
+    def storage(self):
+        return self._storage or _get_storage()
+
+    @property
+    def enabled(self) -> bool:
+        # Sólo se degrada contra Blob real (o el storage que pasó el llamador): un stub que
+        # apunta al disco local de una réplica no se puede rehidratar desde las demás.
+        return self._storage is not None or bool(settings.ARCHIVE_STORAGE_CONNECTION)
+
+    def demote(self, conversation_id: str) -> bool:
+        # Sube el documento completo a Blob y lo reemplaza por un stub con el puntero.
+        if not self.enabled:
+            return False
+        convo, etag = self.repo.get_with_etag(conversation_id)
+        if not convo or convo.tier == "cold":
+            return False
+
+        blob_name = _cold_blob_name(convo.id)
+        payload = json.dumps(asdict(convo), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self.storage.upload_blob(blob_name, gzip.compress(payload))
+
+        stub = Conversation(
+            id=convo.id,
+            user_id=convo.user_id,
+            last_message=convo.last_message,
+            updated_at=convo.updated_at,
+            tier="cold",
+            archive_ref=blob_name,
+        )
+        # Escritura condicional al etag leído: si hubo actividad mientras se subía (412),
+        # no se degrada y se borra el blob recién subido.
+        if not self.repo.upsert_if_unchanged(stub, etag):
+            logger.info("demotion skipped, conversation %s changed concurrently", conversation_id)
+            discard_cold_blob(blob_name, self.storage)
+            return False
+        metrics.record_demotion()
+        return True
+
+    def run(self) -> Dict[str, Any]:
+        # Degrada hasta batch_size conversaciones sin actividad en idle_days.
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=self.idle_days)).isoformat()
+        stats = {"scanned": 0, "demoted": 0, "failed": 0}
+        if not self.enabled:
+            logger.warning("tiering disabled: no Blob connection (ARCHIVE_STORAGE_CONNECTION) configured")
+            return stats
+        for cid in self.repo.find_idle_ids(before=cutoff, limit=self.batch_size):
+            stats["scanned"] += 1
+            try:
+                if self.demote(cid):
+                    stats["demoted"] += 1
+            except Exception:
+                stats["failed"] += 1
+                logger.exception("demotion failed for conversation %s", cid)
+        counts = self.repo.tier_counts()
+        metrics.record_counts(counts)
+        logger.info("tiering run: %s", {**stats, **counts})
+        return stats
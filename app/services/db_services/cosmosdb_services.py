@@ -1,9 +1,12 @@
 from dataclasses import asdict
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, Iterator, List
 from datetime import datetime, timezone
 import re
 import uuid
 
+from app.core.config import settings
+from app.core.tokens import count_tokens, message_tokens, MESSAGE_OVERHEAD_TOKENS
+
 from db.repository.resources import ResourceRepository
 from db.repository.conversations import ConversationRepository
 from db.repository.blocked import BlockedRepository
@@ -16,6 +19,20 @@ _DEFAULT_ANSWER = "default_answer"
 _PROMPT_KIND = "prompt"
 
 
+class NotFoundError(ValueError):
+    # Entidad inexistente (subclase de ValueError para no romper llamadores existentes).
+    pass
+
+
+class ConflictError(Exception):
+    # Escritura rechazada por un cambio concurrente que no se pudo resolver reintentando.
+    pass
+
+
+# Reintentos de escrituras condicionales (append vs compactación/tiering).
+_WRITE_RETRIES = 5
+
+
 def _prompt_id(name: str) -> str:
     # Construye el id canónico de un prompt.
     return f"{_PROMPT_KIND}:{name}"
@@ -86,10 +103,16 @@ class DBService:
         # Elimina un Resource por id.
         return self.resource_repo.delete(id)
 
+    def iter_resources(self, kind: Optional[str] = None) -> Iterator[dict]:
+        # Itera Resources como dicts (para listados en streaming).
+        for resource in self.resource_repo.iter_all(kind):
+            yield asdict(resource)
+
     # -------------------- Conversations --------------------
 
     def create_conversation(self, *, user_id: str, id: Optional[str] = None) -> dict:
         # Crea una conversación nueva (historial vacío y last_message="").
+        # Con id explícito nunca sobreescribe: ConflictError si el id ya existe.
         if not user_id:
             raise ValueError("'user_id' is required")
 
@@ -104,7 +127,8 @@ class DBService:
         if hasattr(convo, "updated_at"):
             setattr(convo, "updated_at", datetime.now(timezone.utc).isoformat())
 
-        self.conversation_repo.upsert(convo)
+        if not self.conversation_repo.create(convo):
+            raise ConflictError(f"Conversation '{conv_id}' already exists")
         return asdict(convo)
 
     def append_message(
@@ -121,54 +145,134 @@ class DBService:
         if role not in ("user", "assistant", "system"):
             raise ValueError("'role' must be one of: user|assistant|system")
 
-        convo = self.conversation_repo.get(conversation_id)
-        if not convo:
-            raise ValueError(f"Conversation '{conversation_id}' not found")
-
         msg = {
             "role": role,
             "content": content,
             "meta": meta or {},
             "ts": datetime.now(timezone.utc).isoformat(),
+            # Conteo persistido para armar ventanas por tokens sin re-tokenizar.
+            "tokens": count_tokens(content) + MESSAGE_OVERHEAD_TOKENS,
         }
 
-        # Inserta en historial si el modelo lo soporta.
-        if hasattr(convo, "messages") and isinstance(getattr(convo, "messages"), list):
-            convo.messages.append(msg)  # type: ignore[attr-defined]
+        # Escritura condicional al etag leído: la compactación y el tiering reescriben el
+        # mismo documento, y un upsert ciego deshacería su trabajo. Ante un 412 se relee
+        # y se vuelve a aplicar el mensaje.
+        for _ in range(_WRITE_RETRIES):
+            convo, etag = self.conversation_repo.get_for_update(conversation_id)
+            if not convo:
+                raise NotFoundError(f"Conversation '{conversation_id}' not found")
 
-        # Mantiene last_message para listados/orden.
-        if hasattr(convo, "last_message"):
-            convo.last_message = content  # type: ignore[attr-defined]
+            # Inserta en historial si el modelo lo soporta.
+            if hasattr(convo, "messages") and isinstance(getattr(convo, "messages"), list):
+                convo.messages.append(msg)  # type: ignore[attr-defined]
 
-        # Actualiza marca temporal.
-        if hasattr(convo, "updated_at"):
-            setattr(convo, "updated_at", datetime.now(timezone.utc).isoformat())
+            # Mantiene last_message para listados/orden.
+            if hasattr(convo, "last_message"):
+                convo.last_message = content  # type: ignore[attr-defined]
 
-        self.conversation_repo.upsert(convo)
-        return msg
+            # Actualiza marca temporal.
+            if hasattr(convo, "updated_at"):
+                setattr(convo, "updated_at", datetime.now(timezone.utc).isoformat())
 
-    def get_history(self, conversation_id: str, limit: int = 20) -> List[Dict[str, Any]]:
-        # Devuelve los últimos N mensajes; si no hay arreglo, hace fallback a last_message.
+            if self.conversation_repo.upsert_if_unchanged(convo, etag):
+                return msg
+        raise ConflictError(f"Conversation '{conversation_id}' is being modified concurrently, retry later")
+
+    def get_history(
+        self,
+        conversation_id: str,
+        limit: Optional[int] = 20,
+        *,
+        max_tokens: Optional[int] = None,
+        include_summary: bool = False
+    ) -> List[Dict[str, Any]]:
+        # Devuelve los mensajes más recientes que entran en max_tokens (y en limit, si se indica).
+        # Con include_summary antepone el resumen de turnos compactados como mensaje "system".
         convo = self.conversation_repo.get(conversation_id)
         if not convo:
             return []
+        return self.history_window(convo, limit, max_tokens=max_tokens, include_summary=include_summary)
 
+    @staticmethod
+    def history_window(
+        convo: Any,
+        limit: Optional[int] = 20,
+        *,
+        max_tokens: Optional[int] = None,
+        include_summary: bool = False
+    ) -> List[Dict[str, Any]]:
+        # Ventana de get_history() sobre una conversación ya leída (evita releerla).
+        # Si no hay arreglo, hace fallback a last_message.
         if hasattr(convo, "messages") and isinstance(getattr(convo, "messages"), list):
             msgs: List[Dict[str, Any]] = getattr(convo, "messages")  # type: ignore[assignment]
             if limit is not None and limit > 0:
-                return msgs[-limit:]
-            return msgs
+                msgs = msgs[-limit:]
+
+            summary_msg: Optional[Dict[str, Any]] = None
+            summary = getattr(convo, "summary", "")
+            if include_summary and summary:
+                summary_tokens = getattr(convo, "summary_tokens", 0) or count_tokens(summary)
+                summary_msg = {
+                    "role": "system",
+                    "content": summary,
+                    "tokens": summary_tokens + MESSAGE_OVERHEAD_TOKENS,
+                }
+
+            if max_tokens is None:
+                return [summary_msg, *msgs] if summary_msg else msgs
+
+            # El resumen entra primero; luego se recorre desde el mensaje más nuevo
+            # y se corta en el primero que no entra (la ventana queda contigua).
+            budget = max_tokens
+            if summary_msg and summary_msg["tokens"] <= budget:
+                budget -= summary_msg["tokens"]
+            else:
+                summary_msg = None
+            start = len(msgs)
+            while start > 0:
+                cost = message_tokens(msgs[start - 1])
+                if cost > budget:
+                    break
+                budget -= cost
+                start -= 1
+            window = msgs[start:]
+            return [summary_msg, *window] if summary_msg else window
 
         if hasattr(convo, "last_message") and getattr(convo, "last_message"):
             return [{"role": "unknown", "content": getattr(convo, "last_message")}]
 
         return []
 
+    def get_prompt_history(self, conversation_id: str) -> List[Dict[str, Any]]:
+        # Ventana lista para el modelo: resumen + mensajes recientes dentro de HISTORY_MAX_TOKENS.
+        return self.get_history(
+            conversation_id,
+            limit=None,
+            max_tokens=settings.HISTORY_MAX_TOKENS,
+            include_summary=True,
+        )
+
+    def compact_conversation(self, conversation_id: str) -> Optional[dict]:
+        # Compacta una conversación a demanda (el job periódico usa el mismo compactador).
+        from app.services.conversation_services.compaction import ConversationCompactor
+
+        return ConversationCompactor(repo=self.conversation_repo).compact(conversation_id)
+
     def get_conversation(self, id: str) -> Optional[dict]:
         # Obtiene una conversación por id como dict.
         conversation = self.conversation_repo.get(id)
         return asdict(conversation) if conversation else None
 
+    def iter_conversations(self, user_id: str) -> Iterator[dict]:
+        # Itera las conversaciones de un usuario sin el historial (vista de listado).
+        for convo in self.conversation_repo.iter_by_user(user_id):
+            yield {
+                "id": convo.id,
+                "user_id": convo.user_id,
+                "last_message": convo.last_message,
+                "updated_at": convo.updated_at,
+            }
+
     # -------------------- Blocked list --------------------
 
     def _warmup_blocked(self):
@@ -241,3 +345,14 @@ class DBService:
             "contains_blocked_words": bool(matches),
             "matches": matches,
         }
+
+
+# Singleton simple: la cache de términos bloqueados se comparte entre invocaciones.
+_db_service: Optional[DBService] = None
+
+
+def get_db_service() -> DBService:
+    global _db_service
+    if _db_service is None:
+        _db_service = DBService()
+    return _db_service
@@ -1,3 +1,230 @@
-# Placeholder for email service interactions
+from dataclasses import asdict
+from datetime import datetime, timezone
+from email.message import EmailMessage
+from typing import Any, Dict, Optional
+import json
+import smtplib
+import time
+import uuid
+
+from tenacity import Retrying, retry_if_exception, stop_after_attempt, wait_exponential
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.services.email_services.smtp_pool import SMTPConnectionPool
+from db.models import EmailDelivery
+from db.repository.email_deliveries import EmailDeliveryRepository
+
+# Importación opcional del SDK de colas; sin él (o sin conexión) se usa una cola en memoria.
+try:
+    from azure.storage.queue import QueueClient, TextBase64EncodePolicy, TextBase64DecodePolicy  # type: ignore
+except Exception:  # pragma: no cover
+    QueueClient = None  # type: ignore
+
+logger = get_logger("email")
+
+
+class LocalQueue:
+    # Stand-in en memoria con la interfaz mínima de QueueClient que usa este módulo
+    # (incluye visibility timeout: lo no borrado vuelve a estar disponible).
+
+    class _Message:
+        def __init__(self, content: str) -> None:
+            self.id = uuid.uuid4().hex
+            self.content = content
+            self.dequeue_count = 0
+            self.visible_at = 0.0
+
+    def __init__(self) -> None:
+        self._items: Dict[str, "LocalQueue._Message"] = {}
+
+    def send_message(self, content: str):
+        msg = self._Message(content)
+        self._items[msg.id] = msg
+        return msg
+
+    def receive_messages(self, max_messages: int = 1, visibility_timeout: Optional[int] = None):
+        now = time.monotonic()
+        taken = [m for m in self._items.values() if m.visible_at <= now][:max_messages]
+        for m in taken:
+            m.dequeue_count += 1
+            m.visible_at = now + (visibility_timeout or 30)
+        return iter(taken)
+
+    def delete_message(self, message) -> None:
+        self._items.pop(message.id, None)
+
+
+# Singletons básicos (mismo patrón que get_client()/get_kv()).
+_queue = None
+_pool: Optional[SMTPConnectionPool] = None
+
+
+def get_queue():
+    global _queue
+    if _queue is None:
+        if settings.EMAIL_QUEUE_CONNECTION and QueueClient is not None:
+            # Base64 para que el mensaje sea compatible con el queue trigger de Functions.
+            _queue = QueueClient.from_connection_string(
+                settings.EMAIL_QUEUE_CONNECTION,
+                settings.EMAIL_QUEUE_NAME,
+                message_encode_policy=TextBase64EncodePolicy(),
+                message_decode_policy=TextBase64DecodePolicy(),
+            )
+        else:
+            _queue = LocalQueue()
+    return _queue
+
+
+def get_smtp_pool() -> SMTPConnectionPool:
+    global _pool
+    if _pool is None:
+        _pool = SMTPConnectionPool(
+            settings.SMTP_HOST,
+            settings.SMTP_PORT,
+            username=settings.SMTP_USER,
+            password=settings.SMTP_PASSWORD,
+            starttls=settings.SMTP_STARTTLS,
+            size=settings.SMTP_POOL_SIZE,
+        )
+    return _pool
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
 def send_email(to, subject, body):
-    return f"Email sent to {to} with subject '{subject}'"
+    # Encola el email para entrega asíncrona y devuelve el id de seguimiento.
+    # El request HTTP no espera al SMTP: la entrega la hace el worker de la cola.
+    if not to:
+        raise ValueError("'to' is required")
+    delivery_id = uuid.uuid4().hex
+    EmailDeliveryRepository().upsert(EmailDelivery(id=delivery_id, to=to, subject=subject, updated_at=_now()))
+    payload = {"id": delivery_id, "to": to, "subject": subject, "body": body}
+    get_queue().send_message(json.dumps(payload, ensure_ascii=False))
+    return delivery_id
+
+
+def get_delivery_status(delivery_id: str) -> Optional[dict]:
+    # Estado de entrega registrado por el worker.
+    delivery = EmailDeliveryRepository().get(delivery_id)
+    return asdict(delivery) if delivery else None
+
+
+def _is_transient(ex: BaseException) -> bool:
+    # Desconexiones, timeouts y respuestas 4xx se reintentan; 5xx es definitivo.
+    if isinstance(ex, smtplib.SMTPResponseException):
+        return 400 <= ex.smtp_code < 500
+    if isinstance(ex, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in ex.recipients.values())
+    return isinstance(ex, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, OSError, TimeoutError))
+
+
+class EmailWorker:
+    """Entrega emails de la cola reutilizando conexiones SMTP del pool y registra su estado."""
+
+    def __init__(
+        self,
+        pool: Optional[SMTPConnectionPool] = None,
+        queue: Any = None,
+        repo: Optional[EmailDeliveryRepository] = None,
+        *,
+        max_retries: Optional[int] = None,
+        max_dequeue: Optional[int] = None,
+    ) -> None:
+        self.pool = pool or get_smtp_pool()
+        self.queue = queue if queue is not None else get_queue()
+        self.repo = repo or EmailDeliveryRepository()
+        self.max_retries = max_retries or settings.SMTP_MAX_RETRIES
+        self.max_dequeue = max_dequeue or settings.EMAIL_MAX_DEQUEUE
+
+    def _record(self, payload: Dict[str, Any], status: str, attempts: int, error: str = "") -> None:
+        self.repo.upsert(EmailDelivery(
+            id=payload["id"],
+            to=payload["to"],
+            subject=payload.get("subject", ""),
+            status=status,
+            attempts=attempts,
+            error=error,
+            updated_at=_now(),
+        ))
+
+    def _send(self, payload: Dict[str, Any]) -> None:
+        msg = EmailMessage()
+        msg["From"] = settings.SMTP_FROM
+        msg["To"] = payload["to"]
+        msg["Subject"] = payload.get("subject", "")
+        msg.set_content(payload.get("body") or "")
+        with self.pool.connection() as conn:
+            conn.send_message(msg)
+
+    def deliver(self, payload: Dict[str, Any], dequeue_count: int = 1) -> bool:
+        # Envía con reintentos y backoff exponencial ante errores transitorios.
+        # True si se envió o falló de forma definitiva (el mensaje puede borrarse);
+        # False si conviene que la cola lo vuelva a entregar más tarde.
+        # La cola entrega al menos una vez: si el envío ya quedó registrado no se repite.
+        current = self.repo.get(payload["id"])
+        if current is not None and current.status == "sent":
+            logger.info("email %s already sent, skipping redelivery", payload["id"])
+            return True
+
+        attempts = 0
+        try:
+            for attempt in Retrying(
+                stop=stop_after_attempt(self.max_retries),
+                wait=wait_exponential(multiplier=0.5, max=8),
+                retry=retry_if_exception(_is_transient),
+                reraise=True,
+            ):
+                with attempt:
+                    attempts += 1
+                    self._send(payload)
+        except Exception as ex:
+            final = not _is_transient(ex) or dequeue_count >= self.max_dequeue
+            self._record(payload, "failed" if final else "retrying", attempts, str(ex))
+            logger.warning("email %s %s: %s", payload.get("id"), "failed" if final else "will retry", ex)
+            return final
+
+        # El SMTP ya aceptó el mensaje: un fallo al registrar el estado no debe provocar
+        # un reenvío, así que se registra en el log y el mensaje se da por entregado.
+        try:
+            self._record(payload, "sent", attempts)
+        except Exception:
+            logger.exception("email %s sent but its status could not be recorded", payload["id"])
+        return True
+
+    def drain(self, limit: Optional[int] = None) -> Dict[str, int]:
+        # Toma hasta `limit` mensajes de la cola y los envía por las mismas conexiones del pool.
+        # Sólo para correr sin el host de Functions (p.ej. LocalQueue en desarrollo): en Azure
+        # la cola la consume el queue trigger; drenar en paralelo competiría con su listener.
+        # Los no entregados reaparecen al vencer su visibility timeout.
+        # Un mensaje que falla no corta el lote (ni la invocación que lo drena); uno que no
+        # se puede interpretar se registra y se borra, porque reintentarlo nunca va a servir.
+        limit = settings.EMAIL_BATCH_SIZE if limit is None else limit
+        stats = {"processed": 0, "requeued": 0, "failed": 0, "discarded": 0}
+        if limit <= 0:
+            return stats
+        try:
+            for message in self.queue.receive_messages(max_messages=min(limit, 32), visibility_timeout=120):
+                try:
+                    payload = json.loads(message.content)
+                    if not isinstance(payload, dict) or not payload.get("id") or not payload.get("to"):
+                        raise ValueError("missing 'id' or 'to'")
+                except ValueError as ex:
+                    logger.error("discarding malformed email message %s: %s", getattr(message, "id", "?"), ex)
+                    self.queue.delete_message(message)
+                    stats["discarded"] += 1
+                    continue
+                try:
+                    if self.deliver(payload, getattr(message, "dequeue_count", 1) or 1):
+                        self.queue.delete_message(message)
+                        stats["processed"] += 1
+                    else:
+                        stats["requeued"] += 1
+                except Exception:
+                    logger.exception("email %s could not be processed, will retry", payload["id"])
+                    stats["failed"] += 1
+        except Exception:
+            logger.exception("could not receive email messages")
+        return stats
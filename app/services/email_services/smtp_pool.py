@@ -0,0 +1,93 @@
+from collections import deque
+from contextlib import contextmanager
+from typing import Iterator, Optional
+import smtplib
+import threading
+import time
+
+
+class SMTPConnectionPool:
+    """Pool acotado de conexiones SMTP reutilizables (evita handshake/login por mensaje)."""
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        *,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        starttls: bool = False,
+        size: int = 4,
+        timeout: float = 10.0,
+        max_age: float = 300.0,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+        self.max_age = max_age
+        self._idle: deque = deque()  # (conexión, creada_en)
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _open(self) -> smtplib.SMTP:
+        conn = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.starttls:
+            conn.starttls()
+        if self.username:
+            conn.login(self.username, self.password or "")
+        return conn
+
+    @staticmethod
+    def _close(conn: smtplib.SMTP) -> None:
+        try:
+            conn.quit()
+        except Exception:
+            conn.close()
+
+    def _checkout(self) -> tuple:
+        # Reutiliza una conexión ociosa sana y no vencida; si no hay, abre una nueva.
+        while True:
+            with self._lock:
+                entry = self._idle.pop() if self._idle else None
+            if entry is None:
+                return self._open(), time.monotonic()
+            conn, created = entry
+            if time.monotonic() - created < self.max_age:
+                try:
+                    if conn.noop()[0] == 250:
+                        return entry
+                except Exception:
+                    pass
+            self._close(conn)
+
+    @contextmanager
+    def connection(self) -> Iterator[smtplib.SMTP]:
+        # Presta una conexión; si falla durante el uso se descarta en vez de devolverse.
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError("no SMTP connection available")
+        try:
+            conn, created = self._checkout()
+            try:
+                yield conn
+            except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused):
+                # Rechazo del servidor (p.ej. destinatario inválido): la conexión sigue válida.
+                with self._lock:
+                    self._idle.append((conn, created))
+                raise
+            except BaseException:
+                # Desconexión, timeout o error desconocido: no se devuelve al pool.
+                self._close(conn)
+                raise
+            with self._lock:
+                self._idle.append((conn, created))
+        finally:
+            self._slots.release()
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for conn, _ in idle:
+            self._close(conn)
@@ -15,6 +15,15 @@ class StorageAccount:
         content = blob_client.download_blob().readall()
         return content
 
+    def upload_blob(self, file_name, data, overwrite=True):
+        blob_client = self.container_client.get_blob_client(file_name)
+        blob_client.upload_blob(data, overwrite=overwrite)
+        return file_name
+
+    def delete_blob(self, file_name):
+        blob_client = self.container_client.get_blob_client(file_name)
+        blob_client.delete_blob()
+
     def get_files_list(self, filter_name, download_folder=None):
         blobs = self.container_client.list_blobs(name_starts_with=filter_name)
 
@@ -69,3 +78,52 @@ class StorageAccount:
             download_file.write(blob_client.download_blob().readall())
 
         return download_file_path
+
+
+class LocalStorageAccount:
+    # Stand-in en disco local con la misma interfaz básica que StorageAccount.
+    def __init__(self, base_dir):
+        self.base_dir = base_dir
+
+    def _path(self, file_name):
+        return os.path.join(self.base_dir, file_name)
+
+    def download_blob(self, file_name):
+        with open(self._path(file_name), "rb") as f:
+            return f.read()
+
+    def upload_blob(self, file_name, data, overwrite=True):
+        path = self._path(file_name)
+        if not overwrite and os.path.exists(path):
+            raise FileExistsError(path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        with open(path, "wb") as f:
+            f.write(data)
+        return file_name
+
+    def delete_blob(self, file_name):
+        os.remove(self._path(file_name))
+
+
+def get_archive_storage():
+    # StorageAccount si hay cadena de conexión; si no, disco local sólo en dev: el disco
+    # del contenedor es efímero y por réplica, y lo archivado ya no está en Cosmos.
+    from app.core.config import settings
+
+    if settings.ARCHIVE_STORAGE_CONNECTION:
+        return StorageAccount(settings.ARCHIVE_STORAGE_CONNECTION, settings.ARCHIVE_CONTAINER)
+    if settings.ENV != "dev":
+        raise RuntimeError("ARCHIVE_STORAGE_CONNECTION (or AzureWebJobsStorage) is required outside ENV=dev")
+    return LocalStorageAccount(settings.ARCHIVE_LOCAL_DIR)
+
+
+def get_profile_storage():
+    # Perfiles de invocaciones: mismo criterio que get_archive_storage().
+    from app.core.config import settings
+
+    connection = settings.PROFILE_STORAGE_CONNECTION or settings.ARCHIVE_STORAGE_CONNECTION
+    if connection:
+        return StorageAccount(connection, settings.PROFILE_CONTAINER)
+    return LocalStorageAccount(settings.PROFILE_LOCAL_DIR)
@@ -1,17 +1,213 @@
-import json, azure.functions as func
+import asyncio, json, azure.functions as func
+# Con la extensión de streaming cargada todas las rutas HTTP usan sus tipos (Request/Response).
+from azurefunctions.extensions.http.fastapi import JSONResponse, Request, Response
 from db.repository.client import get_client
 from app.core.config import settings
+from app.core.http import run_sync
+from app.core.throttling import admission_control, get_admission
+from app.core.profiling import profiled
+from app.business import conversations, moderation, resources
+from app.services.conversation_services.compaction import ConversationCompactor
+from app.services.conversation_services import tiering
+from app.services.email_services.email_service import EmailWorker
+from db.repository.conversations import ConversationRepository
 
 app = func.FunctionApp(http_auth_level=func.AuthLevel.ANONYMOUS)
 
 @app.function_name(name="db_health")
 @app.route(route="db/health", methods=["GET"])
-def db_health(_: func.HttpRequest) -> func.HttpResponse:
+@admission_control("db_health")
+@profiled("db_health")
+async def db_health(req: Request) -> Response:
     cli = get_client()
     if not cli.is_configured:
-        return func.HttpResponse(json.dumps({"ok": False, "msg": "COSMOS no configurado"}), mimetype="application/json")
+        return JSONResponse({"ok": False, "msg": "COSMOS no configurado"})
     try:
-        list(cli.db().list_containers())
-        return func.HttpResponse(json.dumps({"ok": True, "db": settings.COSMOS_DB}), mimetype="application/json")
+        await asyncio.to_thread(lambda: list(cli.db().list_containers()))
+        return JSONResponse({"ok": True, "db": settings.COSMOS_DB})
     except Exception as ex:
-        return func.HttpResponse(json.dumps({"ok": False, "error": str(ex)}), status_code=500, mimetype="application/json")
+        return JSONResponse({"ok": False, "error": str(ex)}, status_code=500)
+
+
+# -------------------- Resources / prompts --------------------
+
+@app.function_name(name="list_resources")
+@app.route(route="resources", methods=["GET"])
+@admission_control("list_resources")
+@profiled("list_resources")
+async def list_resources(req: Request) -> Response:
+    return await run_sync(resources.stream_resources, req)
+
+
+@app.function_name(name="get_resource")
+@app.route(route="resources/{id}", methods=["GET"])
+@admission_control("get_resource")
+@profiled("get_resource")
+async def get_resource(req: Request) -> Response:
+    return await run_sync(resources.get_resource, req)
+
+
+@app.function_name(name="put_resource")
+@app.route(route="resources/{id}", methods=["PUT"])
+@admission_control("put_resource")
+@profiled("put_resource")
+async def put_resource(req: Request) -> Response:
+    return await run_sync(resources.put_resource, req)
+
+
+@app.function_name(name="delete_resource")
+@app.route(route="resources/{id}", methods=["DELETE"])
+@admission_control("delete_resource")
+@profiled("delete_resource")
+async def delete_resource(req: Request) -> Response:
+    return await run_sync(resources.delete_resource, req)
+
+
+@app.function_name(name="get_prompt")
+@app.route(route="prompts/{name}", methods=["GET"])
+@admission_control("get_prompt")
+@profiled("get_prompt")
+async def get_prompt(req: Request) -> Response:
+    return await run_sync(resources.get_prompt, req)
+
+
+@app.function_name(name="put_prompt")
+@app.route(route="prompts/{name}", methods=["PUT"])
+@admission_control("put_prompt")
+@profiled("put_prompt")
+async def put_prompt(req: Request) -> Response:
+    return await run_sync(resources.put_prompt, req)
+
+
+# -------------------- Conversations --------------------
+
+@app.function_name(name="list_conversations")
+@app.route(route="conversations", methods=["GET"])
+@admission_control("list_conversations")
+@profiled("list_conversations")
+async def list_conversations(req: Request) -> Response:
+    return await run_sync(conversations.stream_conversations, req)
+
+
+@app.function_name(name="create_conversation")
+@app.route(route="conversations", methods=["POST"])
+@admission_control("create_conversation")
+@profiled("create_conversation")
+async def create_conversation(req: Request) -> Response:
+    return await run_sync(conversations.create_conversation, req)
+
+
+@app.function_name(name="get_conversation")
+@app.route(route="conversations/{id}", methods=["GET"])
+@admission_control("get_conversation")
+@profiled("get_conversation")
+async def get_conversation(req: Request) -> Response:
+    return await run_sync(conversations.get_conversation, req)
+
+
+@app.function_name(name="append_message")
+@app.route(route="conversations/{id}/messages", methods=["POST"])
+@admission_control("append_message")
+@profiled("append_message")
+async def append_message(req: Request) -> Response:
+    return await run_sync(conversations.append_message, req)
+
+
+@app.function_name(name="conversation_history")
+@app.route(route="conversations/{id}/history", methods=["GET"])
+@admission_control("conversation_history")
+@profiled("conversation_history")
+async def conversation_history(req: Request) -> Response:
+    return await run_sync(conversations.stream_history, req)
+
+
+# -------------------- Moderation --------------------
+
+@app.function_name(name="check_conversation")
+@app.route(route="conversations/{id}/moderation", methods=["GET"])
+@admission_control("check_conversation")
+@profiled("check_conversation")
+async def check_conversation(req: Request) -> Response:
+    return await run_sync(moderation.check_conversation, req)
+
+
+@app.function_name(name="check_text")
+@app.route(route="moderation/check", methods=["POST"])
+@admission_control("check_text")
+@profiled("check_text")
+async def check_text(req: Request) -> Response:
+    return await run_sync(moderation.check_text, req)
+
+
+@app.function_name(name="list_blocked")
+@app.route(route="moderation/blocked", methods=["GET"])
+@admission_control("list_blocked")
+@profiled("list_blocked")
+async def list_blocked(req: Request) -> Response:
+    return await run_sync(moderation.stream_blocked, req)
+
+
+@app.function_name(name="block_word")
+@app.route(route="moderation/blocked/{word}", methods=["PUT"])
+@admission_control("block_word")
+@profiled("block_word")
+async def block_word(req: Request) -> Response:
+    return await run_sync(moderation.block_word, req)
+
+
+@app.function_name(name="unblock_word")
+@app.route(route="moderation/blocked/{word}", methods=["DELETE"])
+@admission_control("unblock_word")
+@profiled("unblock_word")
+async def unblock_word(req: Request) -> Response:
+    return await run_sync(moderation.unblock_word, req)
+
+
+# -------------------- Operación --------------------
+
+@app.function_name(name="throttle_metrics")
+@app.route(route="admin/throttle", methods=["GET"])
+@profiled("throttle_metrics")
+async def throttle_metrics(req: Request) -> Response:
+    # Contadores de admisión por ruta (admitidos, rechazados, tasa de rechazo) de este worker.
+    return JSONResponse(get_admission().metrics())
+
+
+@app.function_name(name="tiering_metrics")
+@app.route(route="admin/tiering", methods=["GET"])
+@admission_control("tiering_metrics")
+@profiled("tiering_metrics")
+async def tiering_metrics(req: Request) -> Response:
+    # Documentos por tier (cacheados, ver TieringMetrics.tier_counts) y rehidrataciones
+    # (totales, cache hits y tasa) de este worker.
+    counts = await asyncio.to_thread(tiering.metrics.tier_counts, ConversationRepository().tier_counts)
+    return JSONResponse({**counts, **tiering.metrics.snapshot()})
+
+
+@app.function_name(name="conversation_compaction")
+@app.timer_trigger(schedule="%COMPACTION_SCHEDULE%", arg_name="timer", run_on_startup=False, use_monitor=True)
+@profiled("conversation_compaction")
+def conversation_compaction(timer: func.TimerRequest) -> None:
+    # Resume y archiva en Blob los turnos viejos de conversaciones largas.
+    ConversationCompactor().run()
+
+
+@app.function_name(name="conversation_tiering")
+@app.timer_trigger(schedule="%TIERING_SCHEDULE%", arg_name="timer", run_on_startup=False, use_monitor=True)
+@profiled("conversation_tiering")
+def conversation_tiering(timer: func.TimerRequest) -> None:
+    # Mueve a Blob las conversaciones inactivas más allá de TIERING_IDLE_DAYS.
+    tiering.ConversationTiering().run()
+
+
+@app.function_name(name="email_delivery")
+@app.queue_trigger(arg_name="msg", queue_name="%EMAIL_QUEUE_NAME%", connection="EMAIL_QUEUE_CONNECTION")
+@profiled("email_delivery")
+def email_delivery(msg: func.QueueMessage) -> None:
+    # Entrega el mensaje recibido. El host ya trae lotes (queues.batchSize en host.json) y
+    # los procesa en paralelo; las conexiones SMTP se comparten por el pool del worker.
+    # Si falla de forma transitoria se lanza para que la cola lo reintente (y a
+    # maxDequeueCount, a la poison queue).
+    payload = json.loads(msg.get_body().decode("utf-8"))
+    if not EmailWorker().deliver(payload, msg.dequeue_count or 1):
+        raise RuntimeError(f"email {payload.get('id')} not delivered, will retry")
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Los módulos importan tanto "app.*" como "db.*": se agregan la raíz y app/ al path.
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (_ROOT, os.path.join(_ROOT, "app")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,53 @@
+import socket
+
+import pytest
+
+pytest.importorskip("aiosmtpd")
+pytest.importorskip("azure.cosmos")
+
+from aiosmtpd.controller import Controller
+from aiosmtpd.handlers import Sink
+
+from app.services.email_services import email_service
+from app.services.email_services.smtp_pool import SMTPConnectionPool
+
+
+class _Recorder(Sink):
+    def __init__(self):
+        self.received = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received.append(envelope)
+        return "250 OK"
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_server():
+    handler = _Recorder()
+    controller = Controller(handler, hostname="127.0.0.1", port=_free_port())
+    controller.start()
+    try:
+        yield controller, handler
+    finally:
+        controller.stop()
+
+
+def test_queued_emails_are_batched_over_pooled_connections(smtp_server, monkeypatch):
+    controller, handler = smtp_server
+    queue = email_service.LocalQueue()
+    monkeypatch.setattr(email_service, "_queue", queue)
+    pool = SMTPConnectionPool(controller.hostname, controller.port, size=1)
+
+    ids = [email_service.send_email(f"user{i}@example.com", f"subject {i}", "body") for i in range(5)]
+    stats = email_service.EmailWorker(pool=pool, queue=queue).drain(10)
+
+    assert stats == {"processed": 5, "requeued": 0, "failed": 0, "discarded": 0}
+    assert len(handler.received) == 5
+    assert all(email_service.get_delivery_status(i)["status"] == "sent" for i in ids)
+    pool.close()
@@ -0,0 +1,120 @@
+import asyncio
+import inspect
+import json
+import uuid
+
+import pytest
+from azurefunctions.extensions.http.fastapi import Request, StreamingResponse
+
+import function_app
+from app.core import throttling
+from app.core.throttling import AdmissionController
+
+# Rutas registradas en el FunctionApp, invocadas como lo hace el worker con HTTP
+# streaming activo (sin el host de Functions): Request de la extensión por kwarg.
+_REGISTERED = function_app.app.get_functions()
+_FUNCTIONS = {f.get_function_name(): f.get_user_function() for f in _REGISTERED}
+
+
+def _request(method, path, *, path_params=None, query=b"", body=b"", headers=None):
+    raw = [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]
+    scope = {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "query_string": query,
+        "headers": raw,
+        "path_params": path_params or {},
+        "client": ("10.0.0.1", 1234),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    return Request(scope, receive)
+
+
+async def _call(name, *args, **kwargs):
+    response = await _FUNCTIONS[name](req=_request(*args, **kwargs))
+    if isinstance(response, StreamingResponse):
+        body = b"".join([chunk async for chunk in response.body_iterator])
+    else:
+        body = response.body
+    return response, body
+
+
+@pytest.fixture(autouse=True)
+def admission(monkeypatch):
+    ctl = AdmissionController(rate=1000, burst=1000, max_inflight=4)
+    monkeypatch.setattr(throttling, "_admission", ctl)
+    return ctl
+
+
+def test_sync_and_streaming_routes_share_the_request_model(admission):
+    async def scenario():
+        rid = uuid.uuid4().hex
+        put, body = await _call(
+            "put_resource", "PUT", f"/api/resources/{rid}", path_params={"id": rid},
+            body=json.dumps({"name": "doc", "kind": "kb", "content": "hola"}).encode(),
+        )
+        assert put.status_code == 200 and json.loads(body)["id"] == rid
+
+        got, _ = await _call("get_resource", "GET", f"/api/resources/{rid}", path_params={"id": rid})
+        etag = got.headers["etag"]
+        cached, _ = await _call(
+            "get_resource", "GET", f"/api/resources/{rid}", path_params={"id": rid},
+            headers={"if-none-match": etag},
+        )
+        assert cached.status_code == 304
+
+        listed, body = await _call("list_resources", "GET", "/api/resources", query=b"kind=kb")
+        assert listed.media_type == "application/x-ndjson"
+        assert rid in [json.loads(line)["id"] for line in body.splitlines()]
+
+        created, body = await _call(
+            "create_conversation", "POST", "/api/conversations", body=json.dumps({"user_id": "u1"}).encode(),
+        )
+        assert created.status_code == 201
+        cid = json.loads(body)["id"]
+        for i in range(3):
+            appended, _ = await _call(
+                "append_message", "POST", f"/api/conversations/{cid}/messages", path_params={"id": cid},
+                body=json.dumps({"role": "user", "content": f"m{i}"}).encode(),
+            )
+            assert appended.status_code == 201
+
+        history, body = await _call(
+            "conversation_history", "GET", f"/api/conversations/{cid}/history",
+            path_params={"id": cid}, query=b"limit=2",
+        )
+        assert [json.loads(line)["content"] for line in body.splitlines()] == ["m1", "m2"]
+
+        missing, _ = await _call(
+            "conversation_history", "GET", "/api/conversations/nope/history", path_params={"id": "nope"},
+        )
+        assert missing.status_code == 404
+
+        # Un id existente no se sobreescribe.
+        hijack, _ = await _call(
+            "create_conversation", "POST", "/api/conversations",
+            body=json.dumps({"user_id": "attacker", "id": cid}).encode(),
+        )
+        assert hijack.status_code == 409
+        _, body = await _call("get_conversation", "GET", f"/api/conversations/{cid}", path_params={"id": cid})
+        assert json.loads(body)["user_id"] == "u1" and len(json.loads(body)["messages"]) == 3
+
+        bad, _ = await _call("create_conversation", "POST", "/api/conversations", body=b"not json")
+        assert bad.status_code == 400
+
+    asyncio.run(scenario())
+    # Los streams ya se consumieron: ningún slot de admisión quedó tomado.
+    assert admission.metrics()["inflight"] == 0
+
+
+def test_http_functions_bind_the_route_parameter():
+    # El worker asocia bindings y parámetros por nombre: el de @app.route es "req".
+    for fn in _REGISTERED:
+        trigger = fn.get_trigger()
+        if trigger.type == "httpTrigger":
+            params = inspect.signature(fn.get_user_function()).parameters
+            assert trigger.name in params, fn.get_function_name()
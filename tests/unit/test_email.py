@@ -0,0 +1,75 @@
+import json
+import smtplib
+from contextlib import contextmanager
+
+from app.services.email_services import email_service
+from app.services.email_services.email_service import EmailWorker, LocalQueue
+
+
+class _FakePool:
+    # Pool sin red: registra los mensajes "enviados" por conn.send_message.
+    def __init__(self, fail_for=()):
+        self.sent = []
+        self.fail_for = set(fail_for)
+
+    @contextmanager
+    def connection(self):
+        yield self
+
+    def send_message(self, msg):
+        if msg["To"] in self.fail_for:
+            raise smtplib.SMTPResponseException(550, b"mailbox unavailable")
+        self.sent.append(msg["To"])
+
+
+def _worker(pool, queue=None):
+    return EmailWorker(pool=pool, queue=queue or LocalQueue(), max_retries=1, max_dequeue=3)
+
+
+def test_redelivered_message_is_not_sent_twice():
+    pool = _FakePool()
+    worker = _worker(pool)
+    payload = {"id": "mail-1", "to": "a@example.com", "subject": "s", "body": "b"}
+
+    assert worker.deliver(payload)
+    assert worker.deliver(payload)  # la cola lo entregó de nuevo
+    assert pool.sent == ["a@example.com"]
+
+
+def test_status_write_failure_after_send_does_not_resend(monkeypatch):
+    pool = _FakePool()
+    worker = _worker(pool)
+
+    def broken_record(payload, status, attempts, error=""):
+        raise RuntimeError("cosmos unavailable")
+
+    monkeypatch.setattr(worker, "_record", broken_record)
+    assert worker.deliver({"id": "mail-2", "to": "b@example.com"}) is True
+    assert pool.sent == ["b@example.com"]
+
+
+def test_drain_isolates_bad_messages(monkeypatch):
+    queue = LocalQueue()
+    pool = _FakePool(fail_for={"bounce@example.com"})
+    worker = _worker(pool, queue)
+    queue.send_message("not json")
+    queue.send_message(json.dumps({"subject": "no recipient"}))
+    queue.send_message(json.dumps({"id": "mail-3", "to": "bounce@example.com"}))
+    queue.send_message(json.dumps({"id": "mail-4", "to": "boom@example.com"}))
+    queue.send_message(json.dumps({"id": "mail-5", "to": "ok@example.com"}))
+
+    deliver = worker.deliver
+
+    def flaky_deliver(payload, dequeue_count=1):
+        if payload["to"] == "boom@example.com":
+            raise RuntimeError("unexpected")
+        return deliver(payload, dequeue_count)
+
+    monkeypatch.setattr(worker, "deliver", flaky_deliver)
+    stats = worker.drain(10)
+
+    assert stats == {"processed": 2, "requeued": 0, "failed": 1, "discarded": 2}
+    assert pool.sent == ["ok@example.com"]
+    assert email_service.EmailDeliveryRepository().get("mail-3").status == "failed"
+    # Sólo queda el mensaje que falló inesperadamente, para reintentar.
+    assert [m.content for m in queue._items.values()] == [json.dumps({"id": "mail-4", "to": "boom@example.com"})]
@@ -0,0 +1,106 @@
+import pytest
+
+from app.core.tokens import MESSAGE_OVERHEAD_TOKENS
+from app.services.db_services.cosmosdb_services import DBService
+from app.services.conversation_services.compaction import ConversationCompactor
+from app.services.ia_services.azure_storage_services import LocalStorageAccount
+
+
+def _conversation(svc, sizes):
+    # Mensajes con costo conocido: "tokens" persistido = tamaño + overhead.
+    convo = svc.create_conversation(user_id="u")
+    for i, size in enumerate(sizes):
+        svc.append_message(conversation_id=convo["id"], role="user", content=f"m{i}")
+        svc.conversation_repo.get(convo["id"]).messages[-1]["tokens"] = size + MESSAGE_OVERHEAD_TOKENS
+    return convo["id"]
+
+
+def test_history_window_is_newest_contiguous_messages_within_budget():
+    svc = DBService()
+    cid = _conversation(svc, [10, 500, 10, 10])
+    budget = 2 * (10 + MESSAGE_OVERHEAD_TOKENS)
+
+    window = svc.get_history(cid, limit=None, max_tokens=budget)
+
+    # m1 no entra y corta la ventana: m0 tampoco se incluye aunque entraría.
+    assert [m["content"] for m in window] == ["m2", "m3"]
+    assert svc.get_history(cid, limit=None, max_tokens=0) == []
+    assert len(svc.get_history(cid, limit=3)) == 3
+
+
+def test_history_summary_is_prepended_only_when_it_fits():
+    svc = DBService()
+    cid = _conversation(svc, [10, 10])
+    convo = svc.conversation_repo.get(cid)
+    convo.summary, convo.summary_tokens = "earlier turns", 20
+
+    with_summary = svc.get_history(cid, limit=None, max_tokens=100, include_summary=True)
+    assert with_summary[0]["role"] == "system"
+    assert [m.get("content") for m in with_summary[1:]] == ["m0", "m1"]
+
+    too_small = svc.get_history(cid, limit=None, max_tokens=10 + MESSAGE_OVERHEAD_TOKENS, include_summary=True)
+    assert [m["content"] for m in too_small] == ["m1"]
+
+
+def test_compaction_archives_old_turns_and_skips_on_concurrent_write(tmp_path):
+    svc = DBService()
+    cid = _conversation(svc, [5] * 6)
+    storage = LocalStorageAccount(str(tmp_path))
+    compactor = ConversationCompactor(repo=svc.conversation_repo, storage=storage, keep_messages=2)
+
+    result = compactor.compact(cid)
+    convo = svc.conversation_repo.get(cid)
+    assert result["archived"] == 4 and convo.archived_count == 4
+    assert [m["content"] for m in convo.messages] == ["m4", "m5"]
+    assert (tmp_path / result["blob"]).exists()
+
+    # Una escritura entre la lectura y el upsert condicional descarta la compactación.
+    for i in range(3):
+        svc.append_message(conversation_id=cid, role="user", content=f"n{i}")
+    repo = svc.conversation_repo
+    original = repo.upsert_if_unchanged
+
+    def racing_upsert(c, etag):
+        repo.upsert_if_unchanged = original
+        svc.append_message(conversation_id=cid, role="user", content="late")
+        return original(c, etag)
+
+    repo.upsert_if_unchanged = racing_upsert
+    assert compactor.compact(cid) is None
+    assert repo.get(cid).messages[-1]["content"] == "late"
+    assert not any(p.name.startswith("00000004") for p in (tmp_path / cid).iterdir())
+
+
+def test_compaction_refuses_local_disk_outside_dev(monkeypatch):
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, "ARCHIVE_STORAGE_CONNECTION", None)
+    monkeypatch.setattr(settings, "ENV", "prod")
+    svc = DBService()
+    cid = _conversation(svc, [5] * 6)
+
+    with pytest.raises(RuntimeError):
+        ConversationCompactor(repo=svc.conversation_repo, trigger_messages=2).run()
+    assert len(svc.conversation_repo.get(cid).messages) == 6
+
+
+def test_append_racing_compaction_keeps_both(tmp_path):
+    svc = DBService()
+    cid = _conversation(svc, [5] * 6)
+    repo = svc.conversation_repo
+    compactor = ConversationCompactor(repo=repo, storage=LocalStorageAccount(str(tmp_path)), keep_messages=2)
+    original = repo.get_for_update
+
+    def read_then_compact(conversation_id):
+        # La compactación confirma entre la lectura del append y su escritura.
+        repo.get_for_update = original
+        read = original(conversation_id)
+        assert compactor.compact(conversation_id)
+        return read
+
+    repo.get_for_update = read_then_compact
+    svc.append_message(conversation_id=cid, role="user", content="late")
+
+    convo = repo.get(cid)
+    assert convo.archived_count == 4 and len(convo.archive_blobs) == 1
+    assert [m["content"] for m in convo.messages] == ["m4", "m5", "late"]
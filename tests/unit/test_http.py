@@ -0,0 +1,65 @@
+import gzip
+import json
+
+import pytest
+from azurefunctions.extensions.http.fastapi import Request
+
+from app.core import http
+from app.core.config import settings
+
+
+def _req(headers=None):
+    raw = [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]
+    return Request({"type": "http", "method": "GET", "path": "/api/x", "query_string": b"", "headers": raw})
+
+
+def test_choose_encoding_honours_q_zero():
+    assert http.choose_encoding(None) is None
+    assert http.choose_encoding("gzip, deflate") == "gzip"
+    assert http.choose_encoding("gzip;q=0, identity") is None
+    if http.brotli is not None:
+        assert http.choose_encoding("gzip, br") == "br"
+        assert http.choose_encoding("br;q=0, gzip") == "gzip"
+
+
+def test_etag_matches_lists_wildcard_and_weak():
+    tag = http.make_etag(b"x")
+    assert http.etag_matches(f'"other", {tag}', tag)
+    assert http.etag_matches(f"W/{tag}", tag)
+    assert http.etag_matches("*", tag)
+    assert not http.etag_matches(None, tag)
+    assert not http.etag_matches('"other"', tag)
+
+
+@pytest.mark.parametrize("encoding", ["gzip", "br", None])
+def test_iter_ndjson_round_trip(encoding):
+    if encoding == "br" and http.brotli is None:
+        pytest.skip("brotli not installed")
+    rows = [{"i": i, "text": "ñ" * 50} for i in range(2000)]  # varios chunks de 16KB
+    chunks = list(http.iter_ndjson(rows, encoding))
+    assert len(chunks) > 1
+    body = b"".join(chunks)
+    if encoding == "gzip":
+        body = gzip.decompress(body)
+    elif encoding == "br":
+        body = http.brotli.decompress(body)
+    assert [json.loads(line) for line in body.splitlines()] == rows
+
+
+def test_json_response_etag_depends_on_encoding(monkeypatch):
+    monkeypatch.setattr(settings, "HTTP_COMPRESS_MIN_BYTES", 10)
+    payload = {"content": "x" * 100}
+
+    plain = http.json_response(_req(), payload, etag=True)
+    zipped = http.json_response(_req({"accept-encoding": "gzip"}), payload, etag=True)
+    assert zipped.headers["content-encoding"] == "gzip"
+    assert plain.headers["etag"] != zipped.headers["etag"]
+    assert gzip.decompress(zipped.body) == plain.body
+
+    # Un validador de la representación gzip no revalida la identity (ni al revés).
+    assert http.json_response(
+        _req({"accept-encoding": "gzip", "if-none-match": zipped.headers["etag"]}), payload, etag=True
+    ).status_code == 304
+    assert http.json_response(
+        _req({"if-none-match": zipped.headers["etag"]}), payload, etag=True
+    ).status_code == 200
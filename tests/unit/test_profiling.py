@@ -0,0 +1,109 @@
+import asyncio
+import os
+import threading
+import time
+
+import pytest
+from azurefunctions.extensions.http.fastapi import Request, Response
+
+from app.core import http, profiling
+from app.core.config import settings
+from app.services.ia_services.azure_storage_services import LocalStorageAccount
+
+
+def _req(headers=None):
+    raw = [(k.lower().encode(), v) for k, v in (headers or {}).items()]
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    return Request({"type": "http", "method": "GET", "path": "/api/x", "query_string": b"", "headers": raw}, receive)
+
+
+def test_profiled_returns_handler_unwrapped_when_disabled(monkeypatch):
+    monkeypatch.setattr(settings, "PROFILE_SAMPLE_RATE", 0)
+    monkeypatch.setattr(settings, "PROFILE_TOKEN", None)
+
+    async def handler(req):
+        return Response("ok")
+
+    assert profiling.profiled("h")(handler) is handler
+
+
+def test_non_ascii_profile_header_is_not_requested(monkeypatch):
+    monkeypatch.setattr(settings, "PROFILE_TOKEN", "s3cret")
+    assert not profiling._requested(_req({"x-profile": "ñandú".encode("utf-8")}))
+    assert not profiling._requested(_req({"x-profile": b"wrong"}))
+    assert profiling._requested(_req({"x-profile": b"s3cret"}))
+
+
+@pytest.fixture
+def header_profiling(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "PROFILE_SAMPLE_RATE", 0)
+    monkeypatch.setattr(settings, "PROFILE_TOKEN", "s3cret")
+    monkeypatch.setattr(settings, "PROFILE_MODE", "sample")
+    monkeypatch.setattr(settings, "PROFILE_INTERVAL_MS", 1)
+    monkeypatch.setattr(profiling, "_storage", LocalStorageAccount(str(tmp_path)))
+    return tmp_path
+
+
+def _busy_handler(req):
+    sum(range(2_000_000))
+    return Response("ok")
+
+
+def _unrelated_work(stop):
+    while not stop.is_set():
+        sum(range(10_000))
+
+
+def test_header_triggered_profile_covers_only_the_invocation_threads(header_profiling):
+    @profiling.profiled("h")
+    async def handler(req):
+        return await http.run_sync(_busy_handler, req)
+
+    plain = asyncio.run(handler(req=_req()))
+    assert "x-profile-id" not in plain.headers
+
+    stop = threading.Event()
+    noise = threading.Thread(target=_unrelated_work, args=(stop,))
+    noise.start()
+    try:
+        response = asyncio.run(handler(req=_req({"x-profile": b"s3cret"})))
+    finally:
+        stop.set()
+        noise.join()
+
+    blob_name = response.headers["x-profile-id"]
+    assert blob_name.startswith("h/") and blob_name.endswith(".collapsed")
+    profile = (header_profiling / blob_name).read_text()
+    assert "_busy_handler" in profile
+    # Ni otros threads del proceso ni el event loop entran en el perfil.
+    assert "_unrelated_work" not in profile and "run_until_complete" not in profile
+
+
+def test_profile_covers_the_streamed_ndjson_body(header_profiling):
+    def rows():
+        for i in range(200):
+            sum(range(20_000))
+            yield {"i": i}
+
+    @profiling.profiled("h")
+    async def handler(req):
+        return await http.run_sync(lambda r: http.ndjson_response(r, rows()), req)
+
+    async def scenario():
+        response = await handler(req=_req({"x-profile": b"s3cret"}))
+        blob_name = response.headers["x-profile-id"]
+        # Hasta que no termina el cuerpo no hay perfil.
+        assert not os.path.exists(header_profiling / blob_name)
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        assert len(body.splitlines()) == 200
+        return blob_name
+
+    blob_name = asyncio.run(scenario())
+    path = header_profiling / blob_name
+    deadline = time.monotonic() + 5
+    while not os.path.exists(path) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert "rows" in path.read_text()
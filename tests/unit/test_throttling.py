@@ -0,0 +1,126 @@
+import asyncio
+import threading
+
+from azurefunctions.extensions.http.fastapi import Request, Response, StreamingResponse
+
+from app.core import throttling
+from app.core.throttling import AdmissionController, TokenBucket, _caller_id
+
+
+def _req(headers=None):
+    raw = [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]
+    return Request({"type": "http", "method": "GET", "path": "/api/x", "query_string": b"", "headers": raw, "client": ("127.0.0.1", 1)})
+
+
+def test_token_bucket_refills_at_rate():
+    bucket = TokenBucket(rate=2, capacity=2)
+    now = bucket.updated
+    assert bucket.take(now) == 0 and bucket.take(now) == 0
+    assert bucket.take(now) == 0.5  # falta un token completo a 2 tokens/s
+    assert bucket.take(now + 0.5) == 0
+
+
+def test_acquire_distinguishes_rate_limited_from_overloaded():
+    ctl = AdmissionController(rate=1, burst=1, max_inflight=1)
+    assert ctl.acquire("r", "a") == (None, 0.0)
+    assert ctl.acquire("r", "b")[0] == "overloaded"  # el slot de "a" sigue ocupado
+    ctl.release()
+    rejected, retry_after = ctl.acquire("r", "a")
+    assert rejected == "rate_limited" and 0 < retry_after <= 1
+    assert ctl.metrics()["inflight"] == 0
+    assert ctl.metrics()["routes"]["r"]["rejection_rate"] == round(2 / 3, 4)
+
+
+def test_decorator_sheds_with_retry_after(monkeypatch):
+    monkeypatch.setattr(throttling, "_admission", AdmissionController(rate=0.5, burst=1, max_inflight=5))
+
+    @throttling.admission_control("r")
+    async def handler(req: Request) -> Response:
+        return Response("ok")
+
+    headers = {"x-ms-client-principal-id": "tenant-1"}
+    assert asyncio.run(handler(req=_req(headers))).status_code == 200
+    rejected = asyncio.run(handler(req=_req(headers)))
+    assert rejected.status_code == 429
+    assert rejected.headers["Retry-After"] == "2"
+    # Otro principal tiene su propio bucket.
+    assert asyncio.run(handler(req=_req({"x-ms-client-principal-id": "tenant-2"}))).status_code == 200
+
+
+def test_streaming_response_holds_slot_until_body_is_sent(monkeypatch):
+    ctl = AdmissionController(rate=100, burst=100, max_inflight=1)
+    monkeypatch.setattr(throttling, "_admission", ctl)
+
+    @throttling.admission_control("r")
+    async def handler(req: Request) -> Response:
+        return StreamingResponse(iter([b"a\n", b"b\n"]))
+
+    async def scenario():
+        response = await handler(req=_req())
+        assert ctl.metrics()["inflight"] == 1
+        assert (await handler(req=_req())).status_code == 503
+        chunks = [chunk async for chunk in response.body_iterator]
+        assert chunks == [b"a\n", b"b\n"]
+        assert ctl.metrics()["inflight"] == 0
+
+        # Cliente desconectado a mitad del stream: el slot también se libera.
+        response = await handler(req=_req())
+        await response.body_iterator.__anext__()
+        await response.body_iterator.aclose()
+        assert ctl.metrics()["inflight"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_caller_id_ignores_client_controlled_identity():
+    spoofed = _req({"x-user-id": "random", "x-forwarded-for": "6.6.6.6, 10.0.0.7"})
+    assert _caller_id(spoofed) == "ip:10.0.0.7"
+    assert _caller_id(_req({"x-ms-client-principal-id": "p1", "x-forwarded-for": "10.0.0.7"})) == "principal:p1"
+    assert _caller_id(_req()) == "ip:127.0.0.1"
+
+
+class _FailingRedis:
+    # Cliente falso: el script del bucket falla como un Redis caído.
+    def __init__(self):
+        self.calls = 0
+
+    def register_script(self, _):
+        def script(keys, args):
+            self.calls += 1
+            raise ConnectionError("redis down")
+        return script
+
+
+def test_redis_backend_trips_to_local_buckets_after_failure():
+    client = _FailingRedis()
+    backend = throttling.RedisLimiterBackend(client=client, cooldown=60)
+    assert backend.take("r:a", rate=1, burst=1) == 0
+    assert backend.take("r:a", rate=1, burst=1) > 0  # limitado por el bucket local
+    assert client.calls == 1  # durante el cooldown no se vuelve a intentar Redis
+
+
+def test_blocking_backend_is_acquired_off_the_event_loop(monkeypatch):
+    class _Backend:
+        blocking = True
+
+        def __init__(self):
+            self.threads = []
+
+        def take(self, key, rate, burst):
+            self.threads.append(threading.get_ident())
+            return 0.0
+
+    backend = _Backend()
+    monkeypatch.setattr(throttling, "_admission", AdmissionController(backend, rate=1, burst=1, max_inflight=1))
+
+    @throttling.admission_control("r")
+    async def handler(req: Request) -> Response:
+        return Response("ok")
+
+    async def scenario():
+        loop_thread = threading.get_ident()
+        assert (await handler(req=_req())).status_code == 200
+        return loop_thread
+
+    loop_thread = asyncio.run(scenario())
+    assert backend.threads and backend.threads[0] != loop_thread
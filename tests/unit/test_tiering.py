@@ -0,0 +1,108 @@
+import os
+
+from app.services.conversation_services.tiering import ConversationTiering
+from app.services.db_services.cosmosdb_services import DBService
+from app.services.ia_services.azure_storage_services import LocalStorageAccount
+from app.services.conversation_services import tiering
+from app.core.config import settings
+
+
+def _cold_blobs(base_dir):
+    root = os.path.join(base_dir, "cold")
+    return [os.path.join(d, f) for d, _, files in os.walk(root) for f in files]
+
+
+def test_demote_rehydrate_promote_round_trip(tmp_path, monkeypatch):
+    storage = LocalStorageAccount(str(tmp_path))
+    monkeypatch.setattr(tiering, "_storage", storage)
+    svc = DBService()
+    cid = svc.create_conversation(user_id="u")["id"]
+    svc.append_message(conversation_id=cid, role="user", content="hola")
+
+    assert ConversationTiering(repo=svc.conversation_repo, storage=storage).demote(cid)
+    stub = svc.conversation_repo.get_raw(cid)
+    assert stub.tier == "cold" and stub.messages == [] and _cold_blobs(str(tmp_path))
+
+    # La lectura rehidrata sin tocar Cosmos ni el blob.
+    convo = svc.conversation_repo.get(cid)
+    assert [m["content"] for m in convo.messages] == ["hola"]
+    assert svc.conversation_repo.get_raw(cid).tier == "cold"
+
+    # Escribir la promueve: documento completo sin puntero y blob frío borrado.
+    svc.append_message(conversation_id=cid, role="assistant", content="buenas")
+    promoted = svc.conversation_repo.get_raw(cid)
+    assert promoted.tier == "hot" and promoted.archive_ref == ""
+    assert [m["content"] for m in promoted.messages] == ["hola", "buenas"]
+    assert _cold_blobs(str(tmp_path)) == []
+
+
+def test_demote_skips_and_cleans_up_when_conversation_changes(tmp_path):
+    svc = DBService()
+    cid = svc.create_conversation(user_id="u")["id"]
+    repo = svc.conversation_repo
+
+    class _Racing(LocalStorageAccount):
+        # Llega un mensaje mientras se sube el blob.
+        def upload_blob(self, file_name, data, overwrite=True):
+            super().upload_blob(file_name, data, overwrite)
+            svc.append_message(conversation_id=cid, role="user", content="late")
+            return file_name
+
+    racing = _Racing(str(tmp_path))
+    assert not ConversationTiering(repo=repo, storage=racing).demote(cid)
+    current = repo.get_raw(cid)
+    assert current.tier == "hot" and [m["content"] for m in current.messages] == ["late"]
+    assert _cold_blobs(str(tmp_path)) == []
+
+
+def test_no_demotion_without_blob_connection(monkeypatch):
+    monkeypatch.setattr(settings, "ARCHIVE_STORAGE_CONNECTION", None)
+    svc = DBService()
+    cid = svc.create_conversation(user_id="u")["id"]
+
+    tiering_job = ConversationTiering(repo=svc.conversation_repo)
+    assert not tiering_job.demote(cid)
+    assert tiering_job.run() == {"scanned": 0, "demoted": 0, "failed": 0}
+    assert svc.conversation_repo.get_raw(cid).tier == "hot"
+
+
+def test_append_racing_demotion_promotes_instead_of_clobbering_stub(tmp_path, monkeypatch):
+    storage = LocalStorageAccount(str(tmp_path))
+    monkeypatch.setattr(tiering, "_storage", storage)
+    svc = DBService()
+    repo = svc.conversation_repo
+    cid = svc.create_conversation(user_id="u")["id"]
+    svc.append_message(conversation_id=cid, role="user", content="hola")
+    original = repo.get_for_update
+
+    def read_then_demote(conversation_id):
+        # El stub se escribe entre la lectura del append y su escritura.
+        repo.get_for_update = original
+        read = original(conversation_id)
+        assert ConversationTiering(repo=repo, storage=storage).demote(conversation_id)
+        return read
+
+    repo.get_for_update = read_then_demote
+    svc.append_message(conversation_id=cid, role="user", content="late")
+
+    convo = repo.get_raw(cid)
+    assert convo.tier == "hot" and convo.archive_ref == ""
+    assert [m["content"] for m in convo.messages] == ["hola", "late"]
+    assert _cold_blobs(str(tmp_path)) == []
+
+
+def test_tier_counts_are_cached_between_scans():
+    calls = []
+
+    def scan():
+        calls.append(1)
+        return {"hot": 3, "cold": 1}
+
+    job_metrics = tiering.TieringMetrics()
+    assert job_metrics.tier_counts(scan) == {"hot": 3, "cold": 1}
+    assert job_metrics.tier_counts(scan) == {"hot": 3, "cold": 1}
+    assert len(calls) == 1
+
+    # El job de tiering refresca los conteos sin pasar por el endpoint.
+    job_metrics.record_counts({"hot": 2, "cold": 2})
+    assert job_metrics.tier_counts(scan) == {"hot": 2, "cold": 2} and len(calls) == 1